@@ -0,0 +1,745 @@
+"""
+Mockup Generator Benchmarks
+Times the hot building blocks of multi_device_mockup_generator.py on synthetic screenshots
+Run: python benchmark_mockups.py
+     python benchmark_mockups.py --suite --save-baseline baseline.json
+     python benchmark_mockups.py --suite --compare baseline.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import PIL
+from PIL import Image, ImageChops, ImageDraw, features
+
+from multi_device_mockup_generator import (
+    DEVICES,
+    GENERATOR_VERSION,
+    OUTPUT_FORMATS,
+    RESIZE_QUALITY,
+    THUMBNAIL_SIZE,
+    TRIM_MIN_CONTENT_RATIO,
+    TRIM_THRESHOLD,
+    add_screenshot_to_frame,
+    apply_instagram_story_overlay,
+    auto_trim_whitespace,
+    compose_screenshot_on_frame,
+    create_device_frame,
+    encode_mockup,
+    find_trim_box,
+    get_device_frame,
+    get_screen_mask,
+    open_screenshot,
+    peak_rss_mb,
+    prepare_screenshot,
+    process_all_screenshots,
+    render_device_mockup,
+    render_screenshot_file,
+    reset_peak_rss,
+    resize_screenshot_to_fit,
+    run_shared_memory_pipeline,
+    run_staged_pipeline,
+    to_composite_mode,
+    variant_path
+)
+
+try:
+    import numpy
+except ImportError:  # SSIM columns are skipped without numpy
+    numpy = None
+
+try:
+    import resource
+except ImportError:  # Windows: pipeline peak RSS is not reported
+    resource = None
+
+# Synthetic capture sizes (width, height)
+TRIM_SIZES = {
+    '1080p': (1920, 1080),
+    '4K': (3840, 2160),
+    '5K': (5120, 2880),
+}
+
+# Bump when CORPUS_CASES or the suite's measurements change, so old
+# baselines are not compared against different work
+CORPUS_VERSION = 1
+
+# Suite corpus: resolutions, aspect ratios, white borders, alpha and formats
+CORPUS_CASES = (
+    {'name': 'story_1080x1920', 'size': (1080, 1920), 'border': 24, 'alpha': False, 'format': 'PNG'},
+    {'name': 'phone_1290x2796', 'size': (1290, 2796), 'border': 0, 'alpha': False, 'format': 'JPEG'},
+    {'name': 'phone_720x1280_alpha', 'size': (720, 1280), 'border': 48, 'alpha': True, 'format': 'WEBP'},
+    {'name': 'square_1080x1080', 'size': (1080, 1080), 'border': 12, 'alpha': False, 'format': 'WEBP'},
+    {'name': 'desktop_1920x1080', 'size': (1920, 1080), 'border': 0, 'alpha': False, 'format': 'PNG'},
+    {'name': 'desktop_2560x1600_alpha', 'size': (2560, 1600), 'border': 64, 'alpha': True, 'format': 'PNG'},
+    {'name': 'desktop_3840x2160', 'size': (3840, 2160), 'border': 24, 'alpha': False, 'format': 'JPEG'},
+)
+CORPUS_EXTENSIONS = {'PNG': '.png', 'JPEG': '.jpg', 'WEBP': '.webp'}
+
+def make_bordered_screenshot(width, height, border=24, mode='RGB'):
+    """
+    Build a synthetic screenshot: dark content block inside a thin white border.
+    """
+    image = Image.new('RGB', (width, height), (255, 255, 255))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle(
+        [(border, border), (width - border - 1, height - border - 1)],
+        fill=(40, 90, 160)
+    )
+    draw.rectangle(
+        [(border * 3, border * 3), (width // 2, height // 2)],
+        fill=(250, 120, 30)
+    )
+    if mode != 'RGB':
+        image = image.convert(mode)
+    return image
+
+def make_photo_screenshot(width, height):
+    """
+    Build a synthetic screenshot with gradients and noise, so encoders see
+    something closer to real ad creative than flat colour blocks.
+    """
+    noise = Image.effect_noise((width, height), 40).convert('RGB')
+    gradient = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    image = Image.blend(gradient, noise, 0.35)
+    draw = ImageDraw.Draw(image)
+    draw.rectangle([(width // 8, height // 8), (width // 2, height // 3)], fill=(220, 40, 90))
+    return image
+
+def make_corpus_screenshot(case):
+    """
+    Build one CORPUS_CASES screenshot: photo-like content inside a white
+    border, with a translucent band when the case has alpha.
+    """
+    width, height = case['size']
+    border = case['border']
+    image = Image.new('RGB', (width, height), (255, 255, 255))
+    image.paste(make_photo_screenshot(width - 2 * border, height - 2 * border), (border, border))
+    if case['alpha']:
+        image = image.convert('RGBA')
+        alpha = Image.new('L', image.size, 255)
+        ImageDraw.Draw(alpha).rectangle([(0, height // 2), (width, height // 2 + height // 8)], fill=128)
+        image.putalpha(alpha)
+    return image
+
+def write_corpus(folder, cases=CORPUS_CASES):
+    """
+    Save the synthetic corpus into folder; returns the file paths.
+    """
+    paths = []
+    for case in cases:
+        image = make_corpus_screenshot(case)
+        path = os.path.join(folder, case['name'] + CORPUS_EXTENSIONS[case['format']])
+        if case['format'] == 'JPEG':
+            image.convert('RGB').save(path, 'JPEG', quality=92)
+        elif case['format'] == 'WEBP':
+            image.save(path, 'WEBP', quality=90)
+        else:
+            image.save(path, 'PNG', compress_level=1)
+        paths.append(path)
+    return paths
+
+def make_trim_parity_cases(width=400, height=300):
+    """
+    Small screenshots covering the trim edge cases: asymmetric borders in
+    RGB, RGBA, P and L, a transparent border over dark pixels, values right
+    at the threshold, an all-white image, content too small to keep and
+    content that already fills the frame.
+    """
+    def asymmetric(mode, background=(255, 255, 255)):
+        image = Image.new('RGB', (width, height), background)
+        draw = ImageDraw.Draw(image)
+        draw.rectangle([(17, 5), (width - 41, height - 9)], fill=(40, 90, 160))
+        draw.rectangle([(60, 30), (width // 2, height // 2)], fill=(250, 120, 30))
+        return image.convert(mode)
+
+    cases = {
+        'rgb_asymmetric': asymmetric('RGB'),
+        'p_asymmetric': asymmetric('P'),
+        'l_asymmetric': asymmetric('L'),
+    }
+
+    # Transparent border over black: only a white composite sees it as background
+    rgba = asymmetric('RGB', background=(0, 0, 0)).convert('RGBA')
+    alpha = Image.new('L', rgba.size, 0)
+    ImageDraw.Draw(alpha).rectangle([(17, 5), (width - 41, height - 9)], fill=255)
+    ImageDraw.Draw(alpha).rectangle([(17, 5), (width - 41, 20)], fill=40)
+    rgba.putalpha(alpha)
+    cases['rgba_transparent_border'] = rgba
+
+    threshold = Image.new('RGB', (width, height), (TRIM_THRESHOLD,) * 3)
+    ImageDraw.Draw(threshold).rectangle([(33, 11), (width - 7, height - 50)], fill=(255, 255, TRIM_THRESHOLD - 1))
+    cases['rgb_at_threshold'] = threshold
+
+    cases['all_white'] = Image.new('RGB', (width, height), (255, 255, 255))
+
+    tiny = Image.new('RGB', (width, height), (255, 255, 255))
+    ImageDraw.Draw(tiny).rectangle([(100, 100), (104, 104)], fill=(0, 0, 0))
+    cases['below_min_content_ratio'] = tiny
+
+    cases['no_border'] = make_photo_screenshot(width, height)
+    return cases
+
+def reference_trim_box(image, threshold=TRIM_THRESHOLD, min_content_ratio=TRIM_MIN_CONTENT_RATIO):
+    """
+    Per-pixel scan used before the vectorized trim; kept for parity checks.
+    Returns the box find_trim_box() should return: the content box
+    (left, top, right, bottom), or None for nothing to trim.
+    """
+    if image.mode == 'RGBA':
+        # Transparent pixels count as white, as on the original composite
+        rgb_image = Image.new('RGB', image.size, (255, 255, 255))
+        rgb_image.paste(image, mask=image.split()[3])
+    else:
+        rgb_image = image.convert('RGB')
+    width, height = rgb_image.size
+    pixels = rgb_image.load()
+
+    def has_content(points):
+        for point in points:
+            r, g, b = pixels[point]
+            if not (r >= threshold and g >= threshold and b >= threshold):
+                return True
+        return False
+
+    top = next((y for y in range(height) if has_content((x, y) for x in range(width))), None)
+    if top is None:
+        return None
+    bottom = next(y + 1 for y in range(height - 1, -1, -1) if has_content((x, y) for x in range(width)))
+    left = next(x for x in range(width) if has_content((x, y) for y in range(height)))
+    right = next(x + 1 for x in range(width - 1, -1, -1) if has_content((x, y) for y in range(height)))
+
+    if right - left < int(width * min_content_ratio) or bottom - top < int(height * min_content_ratio):
+        return None
+    if (left, top, right, bottom) == (0, 0, width, height):
+        return None
+    return left, top, right, bottom
+
+def encode_image(image, image_format='JPEG', **save_kwargs):
+    """
+    Encode a synthetic image to bytes so decoding is part of what gets timed.
+    """
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, **save_kwargs)
+    return buffer.getvalue()
+
+def ssim(first, second, block=8):
+    """
+    Mean SSIM of two same-size images on the luma channel, over
+    non-overlapping blocks. Returns None when numpy is not installed.
+    """
+    if numpy is None:
+        return None
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    a = numpy.asarray(first.convert('L'), dtype=numpy.float64)
+    b = numpy.asarray(second.convert('L'), dtype=numpy.float64)
+    height = a.shape[0] // block * block
+    width = a.shape[1] // block * block
+    a = a[:height, :width].reshape(height // block, block, width // block, block)
+    b = b[:height, :width].reshape(height // block, block, width // block, block)
+    mu_a, mu_b = a.mean(axis=(1, 3)), b.mean(axis=(1, 3))
+    var_a, var_b = a.var(axis=(1, 3)), b.var(axis=(1, 3))
+    cov = (a * b).mean(axis=(1, 3)) - mu_a * mu_b
+    index = ((2 * mu_a * mu_b + c1) * (2 * cov + c2)) / ((mu_a ** 2 + mu_b ** 2 + c1) * (var_a + var_b + c2))
+    return float(index.mean())
+
+def reference_cover_resize(screenshot, target_width, target_height):
+    """
+    Cover-mode resize as it was before crop-before-resize: LANCZOS the whole
+    source, then crop the centre.
+    """
+    scale = max(target_width / screenshot.width, target_height / screenshot.height)
+    new_width, new_height = int(screenshot.width * scale), int(screenshot.height * scale)
+    resized = screenshot.resize((new_width, new_height), Image.Resampling.LANCZOS)
+    left = max(0, (new_width - target_width) // 2)
+    top = max(0, (new_height - target_height) // 2)
+    return resized.crop((left, top, left + target_width, top + target_height))
+
+def reference_rgba_composite(frame, screenshot, screen_coords, device_config, screen_mask=None):
+    """
+    Compositing as it was before opaque screenshots stayed RGB: always
+    convert to RGBA, resize with premultiplied alpha and blend the paste.
+    """
+    screenshot = screenshot.convert('RGBA')
+    resized = resize_screenshot_to_fit(
+        screenshot,
+        screen_coords[2],
+        screen_coords[3],
+        fit_mode=device_config.get('fit_mode', 'contain')
+    )
+    return compose_screenshot_on_frame(frame, resized, screen_coords, device_config, screen_mask=screen_mask)
+
+def time_call(func, *args, repeat=5, **kwargs):
+    """
+    Return the best wall time (seconds) over `repeat` calls.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def benchmark_trim(repeat=5, check_parity=True):
+    """
+    Time auto_trim_whitespace at 1080p, 4K and 5K and verify crop boxes
+    against the per-pixel reference, on those captures and on the
+    make_trim_parity_cases() edge cases.
+    """
+    if check_parity:
+        for label, screenshot in make_trim_parity_cases().items():
+            expected = reference_trim_box(screenshot)
+            actual = find_trim_box(screenshot)
+            assert actual == expected, f"Trim box mismatch on {label}: {actual} != {expected}"
+        print("   ✂️  find_trim_box matches the reference on every parity case")
+
+    results = {}
+    for label, (width, height) in TRIM_SIZES.items():
+        screenshot = make_bordered_screenshot(width, height)
+        if check_parity:
+            expected = reference_trim_box(screenshot)
+            actual = find_trim_box(screenshot)
+            assert actual == expected, f"Trim box mismatch at {label}: {actual} != {expected}"
+        seconds = time_call(auto_trim_whitespace, screenshot, repeat=repeat)
+        results[label] = seconds
+        print(f"   ✂️  auto_trim_whitespace {label} ({width}x{height}): {seconds * 1000:.1f} ms")
+    return results
+
+def benchmark_resize_quality(source_size=(6048, 10752), repeat=3):
+    """
+    Time JPEG decode + resize for each quality mode on every device, and
+    compare the output against 'best' with SSIM. The source is photo-like so
+    SSIM has texture to measure; a flat screenshot scores ~1 in every mode.
+    """
+    screenshot = make_photo_screenshot(*source_size)
+    jpeg_bytes = encode_image(screenshot, 'JPEG', quality=92)
+    results = {}
+
+    def decode_and_resize(device_type, quality):
+        config = DEVICES[device_type]
+        image = open_screenshot(jpeg_bytes, [device_type], quality)
+        return resize_screenshot_to_fit(
+            image,
+            config['screen_width'],
+            config['screen_height'],
+            fit_mode=config.get('fit_mode', 'contain'),
+            quality=quality
+        )
+
+    for device_type in DEVICES:
+        reference = decode_and_resize(device_type, 'best')
+        results[device_type] = {}
+        for quality in RESIZE_QUALITY:
+            seconds = time_call(decode_and_resize, device_type, quality, repeat=repeat)
+            output = decode_and_resize(device_type, quality)
+            score = ssim(reference, output) if output.size == reference.size else None
+            results[device_type][quality] = {'seconds': seconds, 'ssim': score}
+            score_label = f"SSIM {score:.4f}" if score is not None else "SSIM n/a"
+            print(f"   🏎️  {device_type:<16} {quality:<8} {seconds * 1000:7.1f} ms  {score_label}")
+    return results
+
+def benchmark_encoders(repeat=1):
+    """
+    Report encode time and output size of every OUTPUT_FORMATS preset for
+    each device.
+    """
+    results = {}
+    for device_type, config in DEVICES.items():
+        screenshot, _ = prepare_screenshot(
+            make_photo_screenshot(config['screen_width'], config['screen_height']),
+            auto_trim=False
+        )
+        mockup = render_device_mockup(screenshot, device_type)
+        results[device_type] = {}
+        for output_format, preset in OUTPUT_FORMATS.items():
+            if preset['format'] != 'PNG' and not features.check(preset['format'].lower()):
+                print(f"   💾 {device_type:<16} {output_format:<14} skipped (no {preset['format']} support)")
+                continue
+            seconds = time_call(encode_mockup, mockup, output_format=output_format, repeat=repeat)
+            size = len(encode_mockup(mockup, output_format=output_format))
+            results[device_type][output_format] = {'seconds': seconds, 'bytes': size}
+            print(f"   💾 {device_type:<16} {output_format:<14} {seconds * 1000:8.1f} ms  {size / 1024:9.1f} KiB")
+    return results
+
+def benchmark_cover_crop(source_size=(1080, 1920), repeat=3):
+    """
+    Time cover-mode resizing of a 9:16 source into every cover device,
+    resize-then-crop versus crop-before-resize, and report the largest
+    per-channel pixel difference.
+    """
+    screenshot = make_photo_screenshot(*source_size).convert('RGBA')
+    results = {}
+    for device_type, config in DEVICES.items():
+        if config.get('fit_mode') != 'cover':
+            continue
+        target = (config['screen_width'], config['screen_height'])
+        before = time_call(reference_cover_resize, screenshot, *target, repeat=repeat)
+        after = time_call(resize_screenshot_to_fit, screenshot, *target, fit_mode='cover', repeat=repeat)
+        difference = ImageChops.difference(
+            reference_cover_resize(screenshot, *target),
+            resize_screenshot_to_fit(screenshot, *target, fit_mode='cover')
+        )
+        max_diff = max(high for _, high in difference.getextrema())
+        results[device_type] = {'before': before, 'after': after, 'max_diff': max_diff}
+        print(f"   🔲 {device_type:<16} {before * 1000:7.1f} ms → {after * 1000:7.1f} ms  (max diff {max_diff})")
+    return results
+
+def benchmark_output_sizes(devices=None, scales=(0.5, 'thumb'), repeat=3):
+    """
+    Time one render with and without extra output sizes, against rendering
+    1x and then re-decoding the saved PNG in a separate resize job.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as folder:
+        for device_type in devices or DEVICES:
+            config = DEVICES[device_type]
+            input_path = os.path.join(folder, f"{device_type}.png")
+            make_photo_screenshot(config['screen_width'], config['screen_height']).save(input_path, compress_level=1)
+            output_path = os.path.join(folder, f"{device_type}_mockup.png")
+            targets = [(device_type, output_path, 'png')]
+
+            def separate_resize_job():
+                render_screenshot_file(input_path, targets, False)
+                with Image.open(output_path) as mockup:
+                    mockup.load()
+                    for scale in scales:
+                        if scale == 'thumb':
+                            variant = mockup.copy()
+                            variant.thumbnail(THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
+                        else:
+                            variant = mockup.resize((round(mockup.width * scale), round(mockup.height * scale)), Image.Resampling.LANCZOS)
+                        variant.save(variant_path(output_path, scale))
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                single = time_call(render_screenshot_file, input_path, targets, False, repeat=repeat)
+                pyramid = time_call(render_screenshot_file, input_path, targets, False, scales=scales, repeat=repeat)
+                separate = time_call(separate_resize_job, repeat=repeat)
+            results[device_type] = {'single': single, 'pyramid': pyramid, 'separate': separate}
+            print(f"   📐 {device_type:<16} 1x {single * 1000:7.1f} ms  +sizes {pyramid * 1000:7.1f} ms ({pyramid / single - 1:+.0%})"
+                  f"  re-decode job {separate * 1000:7.1f} ms ({separate / single - 1:+.0%})")
+    return results
+
+def _pipeline_run(jobs, workers, use_shared_memory, connection):
+    """
+    Run the pipeline in a fresh process so its children's peak RSS is
+    measured in isolation (None without the resource module).
+    """
+    start = time.perf_counter()
+    for _ in run_shared_memory_pipeline(jobs, workers, use_shared_memory=use_shared_memory):
+        pass
+    seconds = time.perf_counter() - start
+    peak_mb = None
+    if resource is not None:
+        peak_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        # Linux reports kilobytes, macOS bytes
+        peak_mb = peak_rss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+    connection.send((seconds, peak_mb))
+
+def _composite_run(func, device_type, screenshot, repeat, connection):
+    """
+    Time one compositing path in a fresh process and measure how far a single
+    call raises its RSS.
+    """
+    frame, screen_coords, config = get_device_frame(device_type)
+    screen_mask = get_screen_mask(device_type)
+    with contextlib.redirect_stdout(io.StringIO()):
+        func(frame, screenshot, screen_coords, config, screen_mask=screen_mask)
+        # After a reset the peak is the current RSS (Linux only)
+        base_mb = peak_rss_mb() if reset_peak_rss() else None
+        func(frame, screenshot, screen_coords, config, screen_mask=screen_mask)
+        extra_mb = None if base_mb is None else peak_rss_mb() - base_mb
+        seconds = time_call(func, frame, screenshot, screen_coords, config, screen_mask=screen_mask, repeat=repeat)
+    connection.send((seconds, extra_mb))
+
+def benchmark_opaque_compositing(devices=None, source_size=(1290, 2796), repeat=3):
+    """
+    Compare compositing an opaque RGB screenshot through the always-RGBA path
+    with the RGB path, per device: best time and how much one call raises
+    peak RSS (Linux only).
+    """
+    screenshot = make_photo_screenshot(*source_size)
+    # Spawned workers with a low mmap threshold hand freed images back to the
+    # OS, so one path's peak isn't hidden by memory the other left behind
+    context = multiprocessing.get_context('spawn')
+    previous = os.environ.get('MALLOC_MMAP_THRESHOLD_')
+    os.environ['MALLOC_MMAP_THRESHOLD_'] = str(128 * 1024)
+    results = {}
+    try:
+        for device_type in devices or DEVICES:
+            measured = {}
+            for label, func in (('rgba', reference_rgba_composite), ('rgb', add_screenshot_to_frame)):
+                receiver, sender = context.Pipe(duplex=False)
+                process = context.Process(target=_composite_run, args=(func, device_type, screenshot, repeat, sender))
+                process.start()
+                seconds, extra_mb = receiver.recv()
+                process.join()
+                measured[label] = {'seconds': seconds, 'extra_rss_mb': extra_mb}
+            results[device_type] = measured
+            parts = []
+            for label in ('rgba', 'rgb'):
+                part = f"{label.upper():<4} {measured[label]['seconds'] * 1000:7.1f} ms"
+                if measured[label]['extra_rss_mb'] is not None:
+                    part += f" +{measured[label]['extra_rss_mb']:6.1f} MB"
+                parts.append(part)
+            print(f"   🎨 {device_type:<16} {' → '.join(parts)}")
+    finally:
+        if previous is None:
+            del os.environ['MALLOC_MMAP_THRESHOLD_']
+        else:
+            os.environ['MALLOC_MMAP_THRESHOLD_'] = previous
+    return results
+
+def benchmark_shared_memory_pipeline(count=12, device_type='imac24', workers=4):
+    """
+    Compare the shared-memory pipeline with pickling pixels through queues:
+    throughput and peak RSS of a single worker process.
+    """
+    config = DEVICES[device_type]
+    results = {}
+    with tempfile.TemporaryDirectory() as folder:
+        jobs = []
+        for idx in range(count):
+            input_path = os.path.join(folder, f"shot_{idx}.png")
+            make_photo_screenshot(config['screen_width'], config['screen_height']).save(input_path, compress_level=1)
+            output_path = os.path.join(folder, f"shot_{idx}_{device_type}_mockup.png")
+            jobs.append((idx, (input_path, [(device_type, output_path, 'png-fast')], False, 'best', None, None, None, ())))
+
+        for label, use_shared_memory in (('pickle', False), ('shared_memory', True)):
+            receiver, sender = multiprocessing.Pipe(duplex=False)
+            process = multiprocessing.Process(target=_pipeline_run, args=(jobs, workers, use_shared_memory, sender))
+            process.start()
+            seconds, peak_mb = receiver.recv()
+            process.join()
+            results[label] = {'seconds': seconds, 'images_per_second': count / seconds, 'peak_rss_mb': peak_mb}
+            line = f"   🧠 {label:<14} {count / seconds:6.2f} images/s"
+            if peak_mb is not None:
+                line += f"  peak worker RSS {peak_mb:7.1f} MB"
+            print(line)
+    return results
+
+def benchmark_staged_pipeline(count=12, device_type='iphone14', workers=4):
+    """
+    Compare serial rendering with the threaded decode/compose/encode
+    pipeline, and report each stage's busy and waiting time.
+    """
+    config = DEVICES[device_type]
+    results = {}
+    with tempfile.TemporaryDirectory() as folder:
+        jobs = []
+        for idx in range(count):
+            input_path = os.path.join(folder, f"shot_{idx}.png")
+            make_photo_screenshot(config['screen_width'], config['screen_height']).save(input_path, compress_level=1)
+            output_path = os.path.join(folder, f"shot_{idx}_{device_type}_mockup.png")
+            jobs.append((idx, (input_path, [(device_type, output_path, 'png')], False, 'best', None, None, None, ())))
+
+        start = time.perf_counter()
+        for _, job in jobs:
+            render_screenshot_file(*job)
+        serial = time.perf_counter() - start
+
+        stats = {}
+        start = time.perf_counter()
+        for _ in run_staged_pipeline(jobs, workers, stats=stats):
+            pass
+        staged = time.perf_counter() - start
+
+    results = {'serial': count / serial, 'staged': count / staged, 'stages': stats}
+    print(f"   🧵 serial         {count / serial:6.2f} images/s")
+    print(f"   🧵 staged         {count / staged:6.2f} images/s")
+    for stage, stage_stats in stats.items():
+        print(f"      {stage:<8} {stage_stats['workers']} thread(s)  "
+              f"busy {stage_stats['busy_seconds']:.2f}s  waiting {stage_stats['idle_seconds']:.2f}s")
+    return results
+
+def benchmark_worker_crash(count=8, workers=2, planning_delay=0.3):
+    """
+    Kill one process-pool worker mid-batch (as the OOM killer would) and
+    check that only its file is reported as an error. The crash is caught
+    once while a result is being collected and once while the next file is
+    submitted (planning is slowed down so the pool breaks in between).
+    Needs the fork start method, so the injected crash reaches the workers.
+    """
+    import multi_device_mockup_generator as generator
+    if multiprocessing.get_start_method() != 'fork':
+        print("   💥 worker crash check skipped (needs the fork start method)")
+        return None
+
+    render = generator.render_screenshot_file
+    plan = generator.plan_mockups
+    culprit = f"shot_{count // 2}.png"
+
+    def crashing_render(input_path, *args, **kwargs):
+        if os.path.basename(input_path) == culprit:
+            os._exit(1)
+        return render(input_path, *args, **kwargs)
+
+    def slow_plan(*args, **kwargs):
+        time.sleep(planning_delay)
+        return plan(*args, **kwargs)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as folder:
+        input_folder = os.path.join(folder, 'in')
+        os.mkdir(input_folder)
+        for idx in range(count):
+            make_bordered_screenshot(390, 844).save(os.path.join(input_folder, f"shot_{idx}.png"))
+        for label, delay in (('collect', False), ('submit', True)):
+            generator.render_screenshot_file = crashing_render
+            generator.plan_mockups = slow_plan if delay else plan
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    run = process_all_screenshots(input_folder, os.path.join(folder, label), 'iphone14', workers=workers, quality='preview')
+            finally:
+                generator.render_screenshot_file = render
+                generator.plan_mockups = plan
+            errors = [r['filename'] for r in run if r['status'] == 'error']
+            processed = sum(1 for r in run if r['status'] == 'processed')
+            assert errors == [culprit] and processed == count - 1, f"Worker crash while waiting to {label}: errors {errors}, {processed} processed"
+            results[label] = processed
+            print(f"   💥 worker crash caught at {label:<7} 1 error, {processed} mockup(s) rendered")
+    return results
+
+def _suite_source(device_type):
+    """
+    Corpus screenshot matching a device's orientation, used for the
+    building-block timings.
+    """
+    config = DEVICES[device_type]
+    name = 'story_1080x1920' if config['screen_height'] > config['screen_width'] else 'desktop_2560x1600_alpha'
+    return make_corpus_screenshot(next(case for case in CORPUS_CASES if case['name'] == name))
+
+def benchmark_suite(devices=None, repeat=3, run_repeat=1):
+    """
+    Time every building block and a full process_all_screenshots() run over
+    the synthetic corpus, for each device.
+
+    Returns:
+        Baseline dict: environment metadata plus {'blocks': {device: {block:
+        seconds}}, 'runs': {device: seconds}}, best of `repeat` (`run_repeat`
+        for full runs)
+    """
+    results = {
+        'corpus_version': CORPUS_VERSION,
+        'generator_version': GENERATOR_VERSION,
+        'python': platform.python_version(),
+        'pillow': PIL.__version__,
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'blocks': {},
+        'runs': {}
+    }
+    for device_type in devices or DEVICES:
+        config = DEVICES[device_type]
+        screen_width, screen_height = config['screen_width'], config['screen_height']
+        fit_mode = config.get('fit_mode', 'contain')
+        screenshot = _suite_source(device_type)
+        trimmed = to_composite_mode(auto_trim_whitespace(screenshot))
+        frame, screen_coords, _ = get_device_frame(device_type)
+        screen_mask = get_screen_mask(device_type)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            blocks = {
+                'create_device_frame': time_call(create_device_frame, device_type, repeat=repeat),
+                'auto_trim_whitespace': time_call(auto_trim_whitespace, screenshot, repeat=repeat),
+                'resize_screenshot_to_fit': time_call(resize_screenshot_to_fit, trimmed, screen_width, screen_height, fit_mode, repeat=repeat),
+                'add_screenshot_to_frame': time_call(add_screenshot_to_frame, frame, trimmed, screen_coords, config, screen_mask=screen_mask, repeat=repeat),
+            }
+            if config.get('overlay_type') == 'instagram_story':
+                composed = add_screenshot_to_frame(frame, trimmed, screen_coords, config, screen_mask=screen_mask)
+                blocks['apply_instagram_story_overlay'] = time_call(
+                    lambda: apply_instagram_story_overlay(composed.copy(), screen_coords, config), repeat=repeat)
+        results['blocks'][device_type] = blocks
+        for block, seconds in blocks.items():
+            print(f"   🧱 {device_type:<16} {block:<30} {seconds * 1000:8.1f} ms")
+
+    with tempfile.TemporaryDirectory() as folder:
+        corpus = os.path.join(folder, 'corpus')
+        os.mkdir(corpus)
+        write_corpus(corpus)
+        for device_type in devices or DEVICES:
+            output = os.path.join(folder, device_type)
+            with contextlib.redirect_stdout(io.StringIO()):
+                seconds = time_call(process_all_screenshots, corpus, output, device_type, skip_existing=False, repeat=run_repeat)
+            results['runs'][device_type] = seconds
+            print(f"   🏁 {device_type:<16} process_all_screenshots ({len(CORPUS_CASES)} files) {seconds:7.2f} s")
+    return results
+
+def compare_to_baseline(results, baseline, tolerance=0.2):
+    """
+    Print each timing against a saved baseline and return the regressions:
+    (name, baseline seconds, current seconds) for timings more than
+    `tolerance` (a fraction) slower.
+    """
+    if baseline.get('corpus_version') != results['corpus_version']:
+        print(f"   ⚠️  Baseline corpus v{baseline.get('corpus_version')} differs from v{results['corpus_version']}; timings may not be comparable")
+    for key in ('python', 'pillow', 'machine', 'cpu_count'):
+        if baseline.get(key) != results[key]:
+            print(f"   ⚠️  Baseline {key} {baseline.get(key)} differs from {results[key]}")
+
+    regressions = []
+    pairs = [(f"{device}.{block}", baseline.get('blocks', {}).get(device, {}).get(block), seconds)
+             for device, blocks in results['blocks'].items() for block, seconds in blocks.items()]
+    pairs += [(f"{device}.process_all_screenshots", baseline.get('runs', {}).get(device), seconds)
+              for device, seconds in results['runs'].items()]
+    for name, before, after in pairs:
+        if not before:
+            print(f"   ➕ {name:<48} {after * 1000:9.1f} ms (new)")
+            continue
+        change = after / before - 1
+        marker = '🔺' if change > tolerance else '✅'
+        print(f"   {marker} {name:<48} {before * 1000:9.1f} → {after * 1000:9.1f} ms ({change:+.0%})")
+        if change > tolerance:
+            regressions.append((name, before, after))
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the mockup generator")
+    parser.add_argument('--suite', action='store_true',
+                        help="Run the per-device suite on the synthetic corpus instead of the micro-benchmarks")
+    parser.add_argument('--devices', help="Comma-separated device ids for --suite (default: all)")
+    parser.add_argument('--repeat', type=int, default=3, help="Repeats per building block, best time kept (default: 3)")
+    parser.add_argument('--save-baseline', metavar='PATH', help="Write --suite results to a JSON baseline")
+    parser.add_argument('--compare', metavar='PATH', help="Compare --suite results against a JSON baseline")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="Slowdown fraction reported as a regression (default: 0.2)")
+    args = parser.parse_args()
+
+    print("=" * 50)
+    print("Mockup Generator Benchmarks")
+    print("=" * 50)
+    if not (args.suite or args.save_baseline or args.compare):
+        benchmark_trim()
+        benchmark_resize_quality()
+        benchmark_cover_crop()
+        benchmark_encoders()
+        benchmark_opaque_compositing()
+        benchmark_output_sizes()
+        benchmark_shared_memory_pipeline()
+        benchmark_staged_pipeline()
+        benchmark_worker_crash()
+        sys.exit(0)
+
+    devices = [d.strip() for d in args.devices.split(',')] if args.devices else None
+    if devices and any(d not in DEVICES for d in devices):
+        parser.error(f"--devices must be ids from: {', '.join(DEVICES)}")
+    results = benchmark_suite(devices, repeat=args.repeat)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Baseline saved to '{args.save_baseline}'")
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print(f"❌ {len(regressions)} timing(s) more than {args.tolerance:.0%} slower than the baseline")
+            sys.exit(1)
+        print("✅ No regressions against the baseline")
@@ -0,0 +1,358 @@
+"""
+Mockup Render Server
+Local HTTP service that renders uploaded screenshots into device mockups,
+with device frames, fonts and overlays kept warm in a pool of worker processes
+Run: python mockup_server.py serve --port 8765 --workers 4
+     python mockup_server.py bench --requests 200 --concurrency 8
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import signal
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from multi_device_mockup_generator import (
+    DEVICES,
+    OUTPUT_FORMATS,
+    RESIZE_QUALITY,
+    resolve_output_format,
+    stream_mockups,
+    warm_caches
+)
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+MAX_UPLOAD_BYTES = 64 * 1024 * 1024
+LATENCY_WINDOW = 1000  # requests kept for the /metrics percentiles
+
+CONTENT_TYPES = {'PNG': 'image/png', 'WEBP': 'image/webp', 'AVIF': 'image/avif'}
+
+def render_upload(data, device_type, output_format=None, auto_trim=True, quality='best', overlay_settings=None, memory_budget_mb=None):
+    """
+    Worker-process entry point: render one uploaded screenshot.
+
+    Returns:
+        (encoded bytes or None, metadata dict from stream_mockups(), console
+        output such as low-resolution warnings)
+    """
+    item = ('upload', data, overlay_settings) if overlay_settings else ('upload', data)
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        _, encoded, metadata = next(stream_mockups([item], device_type, auto_trim, output_format, quality=quality, memory_budget_mb=memory_budget_mb))
+    return encoded, metadata, log.getvalue()
+
+class RenderService:
+    """
+    Process pool plus bookkeeping shared by the request threads: admission
+    (at most workers + queue_size renders waiting or running) and metrics.
+    """
+
+    def __init__(self, workers=None, queue_size=None, device_types=None, memory_budget_mb=None):
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.memory_budget_mb = memory_budget_mb
+        self.capacity = self.workers + (self.workers * 2 if queue_size is None else queue_size)
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=warm_caches, initargs=(device_types,))
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.started = time.time()
+        self.counters = Counter()
+        self.devices = Counter()
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def start(self):
+        """
+        Start (and warm) every worker now, before the server accepts requests.
+        """
+        for future in [self.executor.submit(os.getpid) for _ in range(self.workers)]:
+            future.result()
+
+    def try_acquire(self):
+        with self.lock:
+            if self.in_flight >= self.capacity:
+                self.counters['rejected'] += 1
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self, device_type, status, seconds):
+        with self.lock:
+            self.in_flight -= 1
+            self.counters[status] += 1
+            self.devices[device_type] += 1
+            self.latencies.append(seconds)
+
+    def render(self, data, device_type, output_format, auto_trim, quality, overlay_settings):
+        return self.executor.submit(render_upload, data, device_type, output_format, auto_trim, quality, overlay_settings, self.memory_budget_mb).result()
+
+    def metrics(self):
+        with self.lock:
+            ordered = sorted(self.latencies)
+            latency = {'count': len(ordered)}
+            if ordered:
+                latency.update(
+                    p50=ordered[(len(ordered) - 1) // 2],
+                    p95=ordered[int((len(ordered) - 1) * 0.95)],
+                    max=ordered[-1]
+                )
+            return {
+                'uptime_seconds': time.time() - self.started,
+                'workers': self.workers,
+                'capacity': self.capacity,
+                'in_flight': self.in_flight,
+                'requests': dict(self.counters),
+                'devices': dict(self.devices),
+                'latency_seconds': latency
+            }
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+class RenderHandler(BaseHTTPRequestHandler):
+    """
+    POST /render?device=iphone14[&format=png&trim=1&quality=best]
+        Body: the screenshot file. Optional X-Overlay-Settings header with a
+        JSON object of overlay_settings overrides. Returns the encoded mockup.
+    GET /metrics  JSON counters and latency percentiles
+    GET /devices  JSON list of device ids
+    """
+
+    server_version = 'MockupServer/1.0'
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def refuse(self, status, payload, headers=None):
+        """
+        send_json() without reading the upload: the unread body would be
+        parsed as the next request, so the connection is closed.
+        """
+        self.send_json(status, payload, {**(headers or {}), 'Connection': 'close'})
+
+    def do_GET(self):
+        path = urllib.parse.urlsplit(self.path).path
+        if path == '/metrics':
+            self.send_json(200, self.server.service.metrics())
+        elif path == '/devices':
+            self.send_json(200, [{'id': key, 'name': config['name']} for key, config in DEVICES.items()])
+        else:
+            self.send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        url = urllib.parse.urlsplit(self.path)
+        if url.path != '/render':
+            self.refuse(404, {'error': 'not found'})
+            return
+        params = dict(urllib.parse.parse_qsl(url.query))
+
+        device_type = params.get('device', 'iphone14')
+        quality = params.get('quality', 'best')
+        auto_trim = params.get('trim', '1').lower() not in ('0', 'false', 'no')
+        if device_type not in DEVICES:
+            self.refuse(400, {'error': f"unknown device '{device_type}'", 'devices': list(DEVICES)})
+            return
+        if quality not in RESIZE_QUALITY:
+            self.refuse(400, {'error': f"unknown quality '{quality}'", 'qualities': list(RESIZE_QUALITY)})
+            return
+        try:
+            output_format = resolve_output_format(device_type, params.get('format'))
+        except ValueError as e:
+            self.refuse(400, {'error': str(e)})
+            return
+        try:
+            overlay_settings = json.loads(self.headers.get('X-Overlay-Settings') or 'null')
+        except ValueError:
+            overlay_settings = []
+        if overlay_settings is not None and not isinstance(overlay_settings, dict):
+            self.refuse(400, {'error': 'X-Overlay-Settings must be a JSON object'})
+            return
+
+        length = int(self.headers.get('Content-Length') or 0)
+        if length <= 0:
+            self.refuse(400, {'error': 'empty body; POST the screenshot file'})
+            return
+        if length > MAX_UPLOAD_BYTES:
+            self.refuse(413, {'error': f"upload larger than {MAX_UPLOAD_BYTES} bytes"})
+            return
+
+        # Backpressure: refuse rather than queue without bound, and before
+        # spending time and memory on an upload that would not be rendered
+        service = self.server.service
+        if not service.try_acquire():
+            self.refuse(503, {'error': 'render queue full'}, {'Retry-After': '1'})
+            return
+        started = time.perf_counter()
+        status = 'error'
+        try:
+            data = self.rfile.read(length)
+            started = time.perf_counter()
+            encoded, metadata, log = service.render(data, device_type, output_format, auto_trim, quality, overlay_settings)
+            for line in log.splitlines():
+                if line.strip():
+                    self.log_message('%s', line.strip())
+            if metadata['status'] != 'processed':
+                self.send_json(400, {'error': metadata['error']})
+                return
+            status = 'rendered'
+        except Exception as e:
+            self.send_json(500, {'error': str(e)})
+            return
+        finally:
+            service.release(device_type, status, time.perf_counter() - started)
+
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPES.get(OUTPUT_FORMATS[output_format]['format'], 'application/octet-stream'))
+        self.send_header('Content-Length', str(len(encoded)))
+        self.send_header('X-Render-Seconds', f"{time.perf_counter() - started:.4f}")
+        self.send_header('X-Trimmed', '1' if metadata['trimmed'] else '0')
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+def _raise_keyboard_interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, workers=None, queue_size=None, device_types=None, quiet=False, memory_budget_mb=None):
+    """
+    Run the render server until Ctrl+C or SIGTERM.
+    """
+    service = RenderService(workers, queue_size, device_types, memory_budget_mb)
+    print(f"🔥 Warming {service.workers} worker(s)...")
+    service.start()
+    server = ThreadingHTTPServer((host, port), RenderHandler)
+    server.daemon_threads = True
+    server.service = service
+    server.quiet = quiet
+    print(f"🚀 Serving mockups on http://{host}:{server.server_address[1]} "
+          f"(capacity {service.capacity}: {service.workers} rendering + {service.capacity - service.workers} queued)")
+    print("   POST /render?device=<id>  |  GET /metrics  |  GET /devices")
+    signal.signal(signal.SIGTERM, _raise_keyboard_interrupt)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        print("👋 Server stopped")
+
+def request_mockup(url, data, device_type='iphone14', output_format=None, overlay_settings=None, timeout=120):
+    """
+    Client helper: POST a screenshot to a running server.
+
+    Returns:
+        (HTTP status, response body bytes, response headers)
+    """
+    params = {'device': device_type}
+    if output_format:
+        params['format'] = output_format
+    request = urllib.request.Request(f"{url.rstrip('/')}/render?{urllib.parse.urlencode(params)}", data=data, method='POST')
+    request.add_header('Content-Type', 'application/octet-stream')
+    if overlay_settings:
+        request.add_header('X-Overlay-Settings', json.dumps(overlay_settings))
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status, response.read(), dict(response.headers)
+    except urllib.error.HTTPError as e:
+        return e.code, e.read(), dict(e.headers)
+
+def load_test(url, data, device_type='iphone14', requests=50, concurrency=4, output_format=None):
+    """
+    Fire `requests` renders at a server from `concurrency` threads and report
+    throughput, latency percentiles and status counts (503s show backpressure).
+    """
+    def one(_):
+        started = time.perf_counter()
+        status, _, _ = request_mockup(url, data, device_type, output_format)
+        return status, time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(one, range(requests)))
+    seconds = time.perf_counter() - started
+
+    statuses = Counter(status for status, _ in outcomes)
+    ok = sorted(latency for status, latency in outcomes if status == 200)
+    print(f"   📈 {requests} request(s), {concurrency} concurrent: {statuses[200] / seconds:.2f} mockups/s")
+    print(f"   Statuses: {', '.join(f'{status} × {count}' for status, count in sorted(statuses.items()))}")
+    if ok:
+        print(f"   Latency p50 {ok[(len(ok) - 1) // 2] * 1000:.0f} ms | "
+              f"p95 {ok[int((len(ok) - 1) * 0.95)] * 1000:.0f} ms | max {ok[-1] * 1000:.0f} ms")
+    return {'seconds': seconds, 'statuses': dict(statuses), 'latencies': ok}
+
+def _sample_screenshot():
+    """
+    PNG bytes of a synthetic 1080x1920 screenshot for bench runs without --image.
+    """
+    from PIL import Image, ImageDraw
+    image = Image.linear_gradient('L').resize((1080, 1920)).convert('RGB')
+    ImageDraw.Draw(image).rectangle([(120, 240), (960, 900)], fill=(220, 40, 90))
+    buffer = io.BytesIO()
+    image.save(buffer, 'PNG')
+    return buffer.getvalue()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local mockup render server and load-test client")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = commands.add_parser('serve', help="Run the render server")
+    serve_parser.add_argument('--host', default=DEFAULT_HOST)
+    serve_parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    serve_parser.add_argument('--workers', type=int, help="Render processes (default: CPU count)")
+    serve_parser.add_argument('--queue', type=int, dest='queue_size',
+                              help="Renders allowed to wait for a worker before 503s (default: 2 per worker)")
+    serve_parser.add_argument('--devices', help="Comma-separated devices to pre-warm (default: all)")
+    serve_parser.add_argument('--memory-budget', type=float, metavar='MB',
+                              help="Per-worker decode budget; bigger uploads are reduced while decoding or rejected")
+    serve_parser.add_argument('-q', '--quiet', action='store_true', help="Don't log each request")
+
+    bench_parser = commands.add_parser('bench', help="Send renders to a running server and report throughput")
+    bench_parser.add_argument('--url', default=f"http://{DEFAULT_HOST}:{DEFAULT_PORT}")
+    bench_parser.add_argument('--image', help="Screenshot to upload (default: a synthetic 1080x1920 PNG)")
+    bench_parser.add_argument('--device', default='iphone14', choices=list(DEVICES))
+    bench_parser.add_argument('--format', dest='output_format', choices=list(OUTPUT_FORMATS))
+    bench_parser.add_argument('--requests', type=int, default=50)
+    bench_parser.add_argument('--concurrency', type=int, default=4)
+    bench_parser.add_argument('--output', help="Also save one rendered mockup here")
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        devices = [d.strip() for d in args.devices.split(',')] if args.devices else None
+        if devices and any(d not in DEVICES for d in devices):
+            parser.error(f"--devices must be ids from: {', '.join(DEVICES)}")
+        serve(args.host, args.port, args.workers, args.queue_size, devices, args.quiet, args.memory_budget)
+    else:
+        if args.image:
+            with open(args.image, 'rb') as f:
+                upload = f.read()
+        else:
+            upload = _sample_screenshot()
+        if args.output:
+            status, body, _ = request_mockup(args.url, upload, args.device, args.output_format)
+            if status != 200:
+                print(f"❌ {status}: {body.decode('utf-8', 'replace')}")
+                sys.exit(1)
+            with open(args.output, 'wb') as f:
+                f.write(body)
+            print(f"💾 Saved mockup to '{args.output}'")
+        load_test(args.url, upload, args.device, args.requests, args.concurrency, args.output_format)
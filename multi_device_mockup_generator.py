@@ -4,10 +4,113 @@ Automatically places screenshots into device frames with transparent background
 Supports: iPhone 14 Pro Max, MacBook Pro 14", MacBook Pro 16", iMac 24"
 """
 
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageChops
+import argparse
+import contextlib
+import fnmatch
+import hashlib
+import io
+import json
+import math
 import os
+import posixpath
+import queue
+import shutil
+import sys
+import threading
+import time
+from collections import deque
+from functools import lru_cache
 from pathlib import Path
 
+# ImageDraw/ImageFont, multiprocessing, process pools and the profiling and
+# CSV modules are imported where they are used, so short invocations (help,
+# runs where every mockup is up to date) don't pay for them
+
+try:
+    import resource
+except ImportError:  # Windows: peak memory is not reported
+    resource = None
+
+# Screenshot file extensions picked up from input folders
+SUPPORTED_FORMATS = ('.png', '.jpg', '.jpeg', '.webp')
+
+# Bump when a change to the rendering code should invalidate existing mockups
+GENERATOR_VERSION = '2.1'
+
+# Incremental-build manifest kept in each output folder. Batches save it every
+# MANIFEST_SAVE_EVERY results or MANIFEST_SAVE_SECONDS, whichever comes first,
+# so an interrupted run keeps what it finished.
+MANIFEST_FILENAME = '.mockup_manifest.json'
+MANIFEST_SAVE_EVERY = 50
+MANIFEST_SAVE_SECONDS = 5.0
+
+# Auto-trim defaults (also recorded in the manifest)
+TRIM_THRESHOLD = 240
+TRIM_MIN_CONTENT_RATIO = 0.1
+
+# Large-image mode, for e.g. full-page scroll captures: sources above
+# LARGE_IMAGE_PIXELS (or too big for the memory budget) are JPEG draft-decoded
+# where possible, trimmed on a probe at most TRIM_PROBE_SIZE px long and reduced
+# straight to the working resolution, so no full-size conversion or trim copies exist
+LARGE_IMAGE_PIXELS = 40_000_000
+TRIM_PROBE_SIZE = 2048
+REDUCIBLE_MODES = ('L', 'LA', 'RGB', 'RGBA', 'RGBX', 'CMYK', 'I', 'F')
+
+# Dedupe: screenshots whose difference hashes (DEDUPE_HASH_SIZE² bits, from a
+# tiny grayscale thumbnail) differ in at most the threshold number of bits
+# render once per device; the others get hardlinks (or copies) of the result.
+# The hash ignores shape and colour, so the aspect ratios and mean colours of
+# the (trimmed) content must match too. The hash stays on the untrimmed image:
+# plain borders give it stable bits. Signatures come from a small probe image.
+DEDUPE_HASH_SIZE = 16
+DEDUPE_THRESHOLD = 10
+DEDUPE_PROBE_SIZE = 512
+DEDUPE_ASPECT_TOLERANCE = 0.02  # relative difference of width / height
+DEDUPE_COLOR_TOLERANCE = 16  # per-channel difference of the mean colour
+
+# Resampling modes: (filter, reducing_gap). A reducing_gap makes Pillow shrink
+# by an integer factor with a cheap box reduce before the final filter pass.
+#   - 'best': full LANCZOS from the original resolution (reference output)
+#   - 'fast': JPEG draft decoding + integer reduce, then LANCZOS
+#   - 'preview': JPEG draft decoding + integer reduce, then BILINEAR
+RESIZE_QUALITY = {
+    'best': (Image.Resampling.LANCZOS, None),
+    'fast': (Image.Resampling.LANCZOS, 3.0),
+    'preview': (Image.Resampling.BILINEAR, 2.0)
+}
+
+# Extra resolution kept when draft-decoding, so auto-trim can remove up to
+# ~20% of each axis without the final resize having to upscale
+DRAFT_OVERSAMPLE = 1.25
+
+# Output encoders. Pick one per run (output_format=...) or per device (an
+# 'output_format' key in its DEVICES entry). All of them keep the alpha channel.
+#   - 'png': Pillow's default zlib level (6)
+#   - 'png-fast': zlib level 1; much faster to encode, slightly larger files
+#   - 'png-small': optimize=True; slowest, smallest lossless PNG
+#   - 'png-palette': quantized to a 256-colour palette (lossy, very small)
+#   - 'webp-lossless' / 'webp': lossless or quality-90 WebP
+#   - 'avif': quality-80 AVIF (needs a Pillow build with AVIF support)
+DEFAULT_OUTPUT_FORMAT = 'png'
+OUTPUT_FORMATS = {
+    'png': {'format': 'PNG', 'extension': '.png', 'options': {}},
+    'png-fast': {'format': 'PNG', 'extension': '.png', 'options': {'compress_level': 1}},
+    'png-small': {'format': 'PNG', 'extension': '.png', 'options': {'optimize': True}},
+    'png-palette': {'format': 'PNG', 'extension': '.png', 'options': {'optimize': True}, 'palette': True},
+    'webp-lossless': {'format': 'WEBP', 'extension': '.webp', 'options': {'lossless': True, 'quality': 80, 'method': 4}},
+    'webp': {'format': 'WEBP', 'extension': '.webp', 'options': {'quality': 90, 'method': 4}},
+    'avif': {'format': 'AVIF', 'extension': '.avif', 'options': {'quality': 80}}
+}
+
+# Extra output sizes next to each full-size mockup (see normalize_scales()):
+# scale factors are saved as name@0.5x.png, 'thumb' as name_thumb.png, fitted
+# inside THUMBNAIL_SIZE
+THUMBNAIL_SIZE = (480, 480)
+
+# Batch execution strategies for process_all_screenshots(pipeline=...)
+PIPELINES = (None, 'shared_memory', 'staged')
+
 # Device configurations
 DEVICES = {
     'iphone14': {
@@ -88,6 +191,7 @@ def create_device_frame(device_type='iphone14'):
     device_height = screen_height + padding['top'] + padding['bottom']
     
     # Create transparent background
+    from PIL import ImageDraw
     frame = Image.new('RGBA', (device_width, device_height), (0, 0, 0, 0))
     draw = ImageDraw.Draw(frame)
     
@@ -179,6 +283,99 @@ def create_device_frame(device_type='iphone14'):
     screen_coords = (screen_x, screen_y, screen_width, screen_height)
     return frame, screen_coords, config
 
+# Frame template cache settings. Set MOCKUP_FRAME_CACHE_DIR to also keep
+# pre-rendered templates on disk between runs.
+FRAME_CACHE_SIZE = 16
+FRAME_CACHE_VERSION = 2  # bump when create_device_frame's or create_screen_mask's drawing changes
+FRAME_CACHE_DIR = os.environ.get('MOCKUP_FRAME_CACHE_DIR')
+
+def device_config_hash(device_type):
+    """
+    Hash of a device's DEVICES entry; editing the config changes the hash.
+    """
+    payload = json.dumps(
+        {'device_type': device_type, 'config': DEVICES[device_type], 'version': FRAME_CACHE_VERSION},
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def create_screen_mask(device_type='iphone14'):
+    """
+    Creates an L-mode mask of the rounded screen area (255 inside the screen)
+    """
+    config = DEVICES[device_type]
+    screen_width = config['screen_width']
+    screen_height = config['screen_height']
+
+    # Same rectangle create_device_frame() draws for the screen (its right and
+    # bottom edges are inclusive), so the clipped corners follow the frame's
+    from PIL import ImageDraw
+    mask = Image.new('L', (screen_width + 1, screen_height + 1), 0)
+    ImageDraw.Draw(mask).rounded_rectangle(
+        [(0, 0), (screen_width, screen_height)],
+        radius=config['border_radius'] - 2,
+        fill=255
+    )
+    return mask.crop((0, 0, screen_width, screen_height))
+
+@lru_cache(maxsize=FRAME_CACHE_SIZE)
+def _cached_frame_template(device_type, config_hash, cache_dir):
+    """
+    Build (or load from cache_dir) the frame template and screen mask for one
+    device config hash.
+    """
+    frame_path = mask_path = None
+    if cache_dir:
+        stem = os.path.join(cache_dir, f"{device_type}_{config_hash[:16]}")
+        frame_path = f"{stem}_frame.png"
+        mask_path = f"{stem}_mask.png"
+        if os.path.exists(frame_path) and os.path.exists(mask_path):
+            try:
+                with Image.open(frame_path) as frame, Image.open(mask_path) as mask:
+                    frame.load()
+                    mask.load()
+                    return frame, mask
+            except OSError:
+                pass  # Corrupt cache entry: redraw and overwrite it
+
+    frame, _, _ = create_device_frame(device_type)
+    mask = create_screen_mask(device_type)
+
+    if cache_dir:
+        Path(cache_dir).mkdir(parents=True, exist_ok=True)
+        for image, path in ((frame, frame_path), (mask, mask_path)):
+            # Write then rename so concurrent workers never read a partial file
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            image.save(temp_path, 'PNG', compress_level=1)
+            os.replace(temp_path, path)
+
+    return frame, mask
+
+def _frame_cache_entry(device_type, cache_dir):
+    if device_type not in DEVICES:
+        raise ValueError(f"Device type '{device_type}' not supported. Choose from: {', '.join(DEVICES.keys())}")
+    return _cached_frame_template(device_type, device_config_hash(device_type), cache_dir or FRAME_CACHE_DIR)
+
+def get_device_frame(device_type='iphone14', cache_dir=None):
+    """
+    Memoized create_device_frame(): returns the same (frame, screen_coords,
+    config) tuple, but only draws once per device config. Treat the returned
+    frame as read-only and copy it before drawing on it.
+    """
+    frame, _ = _frame_cache_entry(device_type, cache_dir)
+    config = DEVICES[device_type]
+    padding = config['device_padding']
+    screen_coords = (padding['left'], padding['top'], config['screen_width'], config['screen_height'])
+    return frame, screen_coords, config
+
+def get_screen_mask(device_type='iphone14', cache_dir=None):
+    """
+    Memoized create_screen_mask(), cached alongside the frame template.
+    """
+    _, mask = _frame_cache_entry(device_type, cache_dir)
+    return mask
+
 def prompt_for_device(default_device='iphone14'):
     """
     Prompt the user to select a device type interactively.
@@ -230,33 +427,86 @@ def prompt_yes_no(message, default=True):
             return False
         print("Please enter 'y' or 'n'.")
 
-def load_font(size, bold=False):
-    """
-    Attempt to load a system font; fall back to PIL default.
-    """
-    font_paths = []
-    if bold:
-        font_paths.extend([
-            "arialbd.ttf",
-            "Arial Bold.ttf",
-            "HelveticaNeue-Bold.ttf",
-            "Helvetica Bold.ttf"
-        ])
-    font_paths.extend([
+# Font names tried, in order, when no font file has been registered
+FONT_SEARCH_NAMES = {
+    False: [
         "arial.ttf",
         "Arial.ttf",
         "HelveticaNeue.ttf",
         "Helvetica.ttf"
-    ])
-    
-    for font_name in font_paths:
-        try:
-            return ImageFont.truetype(font_name, size)
-        except IOError:
-            continue
-    
-    # Fallback to default bitmap font
-    return ImageFont.load_default()
+    ],
+    True: [
+        "arialbd.ttf",
+        "Arial Bold.ttf",
+        "HelveticaNeue-Bold.ttf",
+        "Helvetica Bold.ttf"
+    ]
+}
+
+# Font registry: explicit font files, the resolved file per weight (None means
+# PIL's default bitmap font) and loaded FreeType objects per (size, bold)
+_REGISTERED_FONTS = {False: [], True: []}
+_RESOLVED_FONT_FILES = {}
+_FONT_CACHE = {}
+
+def register_font(path, bold=False):
+    """
+    Register an explicit font file, tried before the system font names.
+    Raises IOError if the file cannot be loaded.
+    """
+    from PIL import ImageFont
+    ImageFont.truetype(path, 12)  # Fail now rather than on first render
+    _REGISTERED_FONTS[bold].insert(0, path)
+    _RESOLVED_FONT_FILES.clear()
+    _FONT_CACHE.clear()
+    _instagram_story_layer.cache_clear()
+
+def _resolve_font_file(bold):
+    """
+    Find the first loadable font file for a weight, probing the filesystem
+    only once per process.
+    """
+    if bold not in _RESOLVED_FONT_FILES:
+        from PIL import ImageFont
+
+        # Bold falls back to the regular fonts, as the system search always did
+        candidates = []
+        if bold:
+            candidates += _REGISTERED_FONTS[True] + FONT_SEARCH_NAMES[True]
+        candidates += _REGISTERED_FONTS[False] + FONT_SEARCH_NAMES[False]
+
+        _RESOLVED_FONT_FILES[bold] = None
+        for font_name in candidates:
+            try:
+                ImageFont.truetype(font_name, 12)
+            except IOError:
+                continue
+            _RESOLVED_FONT_FILES[bold] = font_name
+            break
+    return _RESOLVED_FONT_FILES[bold]
+
+def resolved_font(bold=False):
+    """
+    Report which font file load_font() uses for a weight ('default' for PIL's
+    built-in bitmap font).
+    """
+    return _resolve_font_file(bold) or 'default'
+
+def load_font(size, bold=False):
+    """
+    Attempt to load a system font; fall back to PIL default.
+    Fonts are resolved once per process and cached per (size, bold).
+    """
+    key = (size, bold)
+    if key not in _FONT_CACHE:
+        from PIL import ImageFont
+        font_file = _resolve_font_file(bold)
+        if font_file:
+            _FONT_CACHE[key] = ImageFont.truetype(font_file, size)
+        else:
+            # Fallback to default bitmap font
+            _FONT_CACHE[key] = ImageFont.load_default()
+    return _FONT_CACHE[key]
 
 def _text_width(font, text):
     """
@@ -298,7 +548,95 @@ def wrap_text(text, font, max_width):
         lines.append(current)
     return lines or [text]
 
-def auto_trim_whitespace(image, threshold=240, min_content_ratio=0.1):
+# Per-stage timing: rendering code wraps each step in timed_stage(), and the
+# wall and CPU seconds land in the dict that collect_timings() activated on
+# the current thread. Nothing is recorded outside collect_timings(). Stages
+# do not nest.
+TIMED_STAGES = ('open', 'trim', 'resize', 'paste', 'overlay', 'save')
+FILE_STAGES = ('open', 'trim')  # run once per screenshot, shared by its devices
+_TIMINGS = threading.local()
+
+@contextlib.contextmanager
+def collect_timings(timings, memory=False):
+    """
+    Record timed_stage() blocks run on this thread into timings, as
+    {stage: {'wall': seconds, 'cpu': seconds}}.
+
+    With memory, each stage also gets 'peak_rss_mb': the process's peak RSS
+    while the stage ran (see reset_peak_rss()). Memory is per process, so
+    only use it where no other thread renders at the same time. Ignored
+    where peaks cannot be reset (anything but Linux).
+    """
+    previous = getattr(_TIMINGS, 'current', None), getattr(_TIMINGS, 'memory', False)
+    _TIMINGS.current = timings
+    _TIMINGS.memory = memory and reset_peak_rss()
+    try:
+        yield timings
+    finally:
+        _TIMINGS.current, _TIMINGS.memory = previous
+
+@contextlib.contextmanager
+def timed_stage(stage):
+    """
+    Time a block as one of TIMED_STAGES (see collect_timings).
+    """
+    timings = getattr(_TIMINGS, 'current', None)
+    if timings is None:
+        yield
+        return
+    memory = _TIMINGS.memory
+    if memory:
+        reset_peak_rss()
+    wall, cpu = time.perf_counter(), time.thread_time()
+    try:
+        yield
+    finally:
+        entry = timings.setdefault(stage, {'wall': 0.0, 'cpu': 0.0})
+        entry['wall'] += time.perf_counter() - wall
+        entry['cpu'] += time.thread_time() - cpu
+        if memory:
+            entry['peak_rss_mb'] = max(entry.get('peak_rss_mb', 0.0), peak_rss_mb())
+
+def _proc_status_mb(key):
+    # A kB field of /proc/self/status (Linux), in MB
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(f"{key}:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+def reset_peak_rss():
+    """
+    Reset this process's peak RSS to its current RSS, so peak_rss_mb()
+    measures from here on. Returns False where that is not possible
+    (it needs Linux's /proc/self/clear_refs).
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+def peak_rss_mb():
+    """
+    Peak resident memory of this process in MB: since the last
+    reset_peak_rss() on Linux, since the process started elsewhere (None
+    without the resource module, e.g. on Windows).
+    """
+    peak = _proc_status_mb('VmHWM')
+    if peak is not None:
+        return peak
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+def auto_trim_whitespace(image, threshold=TRIM_THRESHOLD, min_content_ratio=TRIM_MIN_CONTENT_RATIO):
     """
     Automatically detect and remove white/light borders from an image.
 
@@ -312,7 +650,49 @@ def auto_trim_whitespace(image, threshold=240, min_content_ratio=0.1):
     Returns:
         Cropped PIL Image with white borders removed
     """
-    # Convert to RGB if necessary (handles RGBA, P mode, etc.)
+    box = find_trim_box(image, threshold, min_content_ratio)
+    if box is None:
+        return image
+
+    # Crop the original image (not the RGB converted one) to preserve transparency
+    return image.crop(box)
+
+def find_trim_box(image, threshold=TRIM_THRESHOLD, min_content_ratio=TRIM_MIN_CONTENT_RATIO):
+    """
+    Bounding box auto_trim_whitespace() would crop image to, or None when
+    there is nothing to trim (or the content looks too small to be real).
+    """
+    width, height = image.size
+
+    # Bounding box of the content pixels (None when the image is all background)
+    bbox = _content_bbox(image, threshold)
+    if bbox is None:
+        return None
+    left, top, right, bottom = bbox
+
+    # Calculate minimum dimensions to prevent over-trimming
+    min_width = int(width * min_content_ratio)
+    min_height = int(height * min_content_ratio)
+
+    # Validate boundaries
+    content_width = right - left
+    content_height = bottom - top
+
+    # If content area is too small, it might be an error - keep the original
+    if content_width < min_width or content_height < min_height:
+        return None
+
+    # If no trimming needed, keep the original
+    if left == 0 and top == 0 and right == width and bottom == height:
+        return None
+
+    return bbox
+
+def _content_bbox(image, threshold=TRIM_THRESHOLD):
+    """
+    Bounding box of the pixels darker than threshold (transparent pixels
+    count as white), or None when there are none.
+    """
     if image.mode == 'RGBA':
         # Create white background and composite
         background = Image.new('RGB', image.size, (255, 255, 255))
@@ -323,85 +703,218 @@ def auto_trim_whitespace(image, threshold=240, min_content_ratio=0.1):
     else:
         rgb_image = image
 
-    # Get image dimensions
-    width, height = rgb_image.size
-    pixels = rgb_image.load()
-
-    # Find content boundaries by scanning for non-white pixels
-    def is_background_pixel(pixel):
-        """Check if a pixel is considered background (white/near-white)."""
-        r, g, b = pixel
-        return r >= threshold and g >= threshold and b >= threshold
-
-    def scan_for_content_row(y):
-        """Check if a row contains any content pixels."""
-        for x in range(width):
-            if not is_background_pixel(pixels[x, y]):
-                return True
-        return False
+    # Build a content mask in C: each band maps to 255 where it is darker than
+    # the threshold, and the bands are OR-ed together, so a pixel is content
+    # unless all of R, G and B are >= threshold.
+    lut = [255 if value < threshold else 0 for value in range(256)] * 3
+    red, green, blue = rgb_image.point(lut).split()
+    content_mask = ImageChops.lighter(ImageChops.lighter(red, green), blue)
+    return content_mask.getbbox()
 
-    def scan_for_content_col(x):
-        """Check if a column contains any content pixels."""
-        for y in range(height):
-            if not is_background_pixel(pixels[x, y]):
-                return True
-        return False
+def _fit_scale(img_width, img_height, target_width, target_height, fit_mode='contain'):
+    """
+    Scale factor that fits an image into the target size for the fit mode.
+    """
+    width_ratio = target_width / img_width
+    height_ratio = target_height / img_height
+    if fit_mode == 'cover':
+        return max(width_ratio, height_ratio)
+    return min(width_ratio, height_ratio)
 
-    # Find top boundary (first row with content)
-    top = 0
-    for y in range(height):
-        if scan_for_content_row(y):
-            top = y
-            break
+def open_screenshot(source, device_types=(), quality='best'):
+    """
+    Open a screenshot from a path, bytes or PIL Image.
 
-    # Find bottom boundary (last row with content)
-    bottom = height
-    for y in range(height - 1, -1, -1):
-        if scan_for_content_row(y):
-            bottom = y + 1
-            break
+    For quality 'fast' and 'preview', JPEG sources are draft-decoded: libjpeg
+    downscales by 1/2, 1/4 or 1/8 during decoding, as far as the largest
+    requested device screen (plus DRAFT_OVERSAMPLE) allows.
+    """
+    if isinstance(source, Image.Image):
+        return source
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    screenshot = Image.open(source)
 
-    # Find left boundary (first column with content)
-    left = 0
-    for x in range(width):
-        if scan_for_content_col(x):
-            left = x
-            break
+    if quality != 'best' and device_types and screenshot.format == 'JPEG':
+        img_width, img_height = screenshot.size
+        scale = _working_scale(screenshot.size, device_types)
+        if scale < 0.5:
+            screenshot.draft('RGB', (math.ceil(img_width * scale), math.ceil(img_height * scale)))
+    return screenshot
 
-    # Find right boundary (last column with content)
-    right = width
-    for x in range(width - 1, -1, -1):
-        if scan_for_content_col(x):
-            right = x + 1
-            break
+def _working_scale(size, device_types):
+    """
+    Smallest scale (at most 1) from which every device screen is still a
+    downscale, plus DRAFT_OVERSAMPLE headroom for auto-trim.
+    """
+    scale = 0
+    for device_type in device_types:
+        config = DEVICES[device_type]
+        scale = max(scale, _fit_scale(
+            size[0],
+            size[1],
+            config['screen_width'],
+            config['screen_height'],
+            config.get('fit_mode', 'contain')
+        ))
+    return min(1.0, scale * DRAFT_OVERSAMPLE)
 
-    # Calculate minimum dimensions to prevent over-trimming
-    min_width = int(width * min_content_ratio)
-    min_height = int(height * min_content_ratio)
+def decoded_mb(size, mode):
+    """
+    Memory Pillow needs to hold an image of this size and mode, in MB
+    (multi-band images are stored at 4 bytes per pixel).
+    """
+    if mode in ('1', 'L', 'P'):
+        bytes_per_pixel = 1
+    elif mode.startswith('I;16'):
+        bytes_per_pixel = 2
+    else:
+        bytes_per_pixel = 4
+    return size[0] * size[1] * bytes_per_pixel / (1024 * 1024)
 
-    # Validate boundaries
-    content_width = right - left
-    content_height = bottom - top
+def _use_large_image_mode(screenshot, auto_trim=True, memory_budget_mb=None):
+    """
+    True when an opened (not yet decoded) screenshot is over LARGE_IMAGE_PIXELS,
+    or when the normal path would not fit memory_budget_mb: that path holds
+    the decoded image, a full-size RGBA copy and, when trimming, an RGB
+    composite and content mask of the same size.
+    """
+    width, height = screenshot.size
+    if width * height > LARGE_IMAGE_PIXELS:
+        return True
+    if memory_budget_mb is None:
+        return False
+    needed = decoded_mb(screenshot.size, screenshot.mode) + decoded_mb(screenshot.size, 'RGBA') * (3 if auto_trim else 1)
+    return needed > memory_budget_mb
 
-    # If content area is too small, it might be an error - return original
-    if content_width < min_width or content_height < min_height:
-        return image
+def _reduce_in_bands(image, factor, box=None, band_rows=1024):
+    """
+    image.reduce(factor, box) a band of rows at a time. Pillow premultiplies
+    RGBA and LA images into a full-size copy before reducing; bands keep that
+    copy small. Bands start on block boundaries, so the result is identical.
+    """
+    if box is None:
+        box = (0, 0) + image.size
+    if image.mode not in ('LA', 'RGBA'):
+        return image.reduce(factor, box)
+    left, top, right, bottom = box
+    reduced = Image.new(image.mode, (math.ceil((right - left) / factor), math.ceil((bottom - top) / factor)))
+    step = factor * max(1, band_rows // factor)
+    for y in range(top, bottom, step):
+        band = image.crop((left, y, right, min(bottom, y + step)))
+        reduced.paste(band.reduce(factor), (0, (y - top) // factor))
+    return reduced
 
-    # If no trimming needed, return original
-    if left == 0 and top == 0 and right == width and bottom == height:
-        return image
+def _refine_trim_box(image, box, band, band_rows=1024):
+    """
+    Narrow a trim box mapped up from a reduced probe to the exact content
+    edges, as find_trim_box() would find them on the full image. Each edge
+    is searched at full resolution in the band-wide strip just inside it
+    (the probe block it came from), read band_rows at a time.
+    """
+    left, top, right, bottom = box
 
-    # Crop the original image (not the RGB converted one) to preserve transparency
-    cropped = image.crop((left, top, right, bottom))
+    def edge(strip_box, axis, first, default):
+        # Outermost content coordinate on axis (0: x, 1: y) in one strip,
+        # scanned in chunks along the other axis; default when there is none
+        start, end = (strip_box[1], strip_box[3]) if axis == 0 else (strip_box[0], strip_box[2])
+        found = None
+        for offset in range(start, end, band_rows):
+            if axis == 0:
+                chunk = (strip_box[0], offset, strip_box[2], min(end, offset + band_rows))
+            else:
+                chunk = (offset, strip_box[1], min(end, offset + band_rows), strip_box[3])
+            bbox = _content_bbox(image.crop(chunk))
+            if bbox is not None:
+                value = chunk[axis] + (bbox[axis] if first else bbox[axis + 2])
+                found = value if found is None else (min(found, value) if first else max(found, value))
+        return default if found is None else found
+
+    # Keep the probe's edge where a strip shows nothing (the probe averaged
+    # translucent pixels differently)
+    left = edge((left, top, min(right, left + band), bottom), 0, True, left)
+    right = edge((max(left, right - band), top, right, bottom), 0, False, right)
+    top = edge((left, top, right, min(bottom, top + band)), 1, True, top)
+    bottom = edge((left, max(top, bottom - band), right, bottom), 1, False, bottom)
+    return left, top, right, bottom
+
+def _load_large_screenshot(screenshot, device_types=(), auto_trim=True, memory_budget_mb=None):
+    """
+    Large-image mode for load_screenshot(): decode (draft-decoding JPEGs down
+    to the working scale, or further to fit memory_budget_mb), find the trim
+    box on a reduced probe, map it back and refine its edges at full
+    resolution, then reduce just that box to the working resolution and
+    convert it for compositing (see to_composite_mode()).
+
+    Raises:
+        MemoryError: the decoded image alone would exceed memory_budget_mb
+    """
+    source_size = screenshot.size
+    scale = _working_scale(source_size, device_types) if device_types else 1.0
+    with timed_stage('open'):
+        if screenshot.format == 'JPEG':
+            # libjpeg decodes at 1, 1/2, 1/4 or 1/8 scale: take the smallest
+            # step that covers the working scale, or a smaller one to fit the budget
+            steps = (1, 0.5, 0.25, 0.125)
+            draft_scale = min([step for step in steps if step >= scale] or [0.125])
+            if memory_budget_mb is not None:
+                budget_scale = math.sqrt(memory_budget_mb / decoded_mb(source_size, 'RGB'))
+                if draft_scale > budget_scale:
+                    draft_scale = max([step for step in steps if step <= budget_scale] or [0.125])
+            if draft_scale < 1:
+                screenshot.draft('RGB', (int(source_size[0] * draft_scale), int(source_size[1] * draft_scale)))
+        needed = decoded_mb(screenshot.size, screenshot.mode)
+        if screenshot.mode not in REDUCIBLE_MODES:
+            needed += decoded_mb(screenshot.size, 'RGBA')
+        if memory_budget_mb is not None and needed > memory_budget_mb:
+            raise MemoryError(
+                f"decoding {source_size[0]}x{source_size[1]} needs about {needed:.0f} MB, "
+                f"over the {memory_budget_mb:g} MB memory budget"
+            )
+        screenshot.load()
+    if screenshot.mode not in REDUCIBLE_MODES:
+        screenshot = screenshot.convert('RGBA' if screenshot.mode == 'PA' or 'transparency' in screenshot.info else 'RGB')
 
-    return cropped
+    width, height = screenshot.size
+    # Integer reduce factor that keeps the working image at or above scale
+    factor = max(1, int(width / (source_size[0] * scale)))
+    with timed_stage('trim'):
+        box = (0, 0, width, height)
+        if auto_trim:
+            probe_factor = max(1, math.ceil(max(width, height) / TRIM_PROBE_SIZE))
+            probe = _reduce_in_bands(screenshot, probe_factor) if probe_factor > 1 else screenshot
+            probe_box = find_trim_box(probe)
+            if probe_box is not None:
+                # Each probe pixel averages a probe_factor square, so the mapped
+                # box keeps whole blocks and never cuts content the probe saw
+                left, top, right, bottom = probe_box
+                box = (
+                    left * probe_factor,
+                    top * probe_factor,
+                    min(width, right * probe_factor),
+                    min(height, bottom * probe_factor)
+                )
+                if probe_factor > 1:
+                    box = _refine_trim_box(screenshot, box, probe_factor)
+        if factor > 1:
+            prepared = _reduce_in_bands(screenshot, factor, box)
+        elif box != (0, 0, width, height):
+            prepared = screenshot.crop(box)
+        else:
+            prepared = screenshot
+        prepared = to_composite_mode(prepared)
+
+    working_size = (math.ceil(width / factor), math.ceil(height / factor))
+    print(f"   🗜️  Large image ({source_size[0]}x{source_size[1]}): working at {working_size[0]}x{working_size[1]}")
+    return prepared, working_size
 
-def resize_screenshot_to_fit(screenshot, target_width, target_height, fit_mode='contain', filename=""):
+def resize_screenshot_to_fit(screenshot, target_width, target_height, fit_mode='contain', filename="", quality='best'):
     """
     Resize screenshot to fit device screen while maintaining aspect ratio.
     fit_mode options:
         - 'contain': Entire screenshot fits inside (may leave padding)
         - 'cover': Screenshot fills screen; crop overflow to remove padding
+    quality picks the resampling path (see RESIZE_QUALITY).
     """
     img_width, img_height = screenshot.size
     
@@ -412,49 +925,73 @@ def resize_screenshot_to_fit(screenshot, target_width, target_height, fit_mode='
         print(f"      Recommended: at least {int(min_recommended)}px on longest side")
     
     # Calculate scaling factor
-    width_ratio = target_width / img_width
-    height_ratio = target_height / img_height
-    if fit_mode == 'cover':
-        scale_factor = max(width_ratio, height_ratio)
-    else:
-        scale_factor = min(width_ratio, height_ratio)
+    scale_factor = _fit_scale(img_width, img_height, target_width, target_height, fit_mode)
     
     # Calculate new dimensions
     new_width = int(img_width * scale_factor)
     new_height = int(img_height * scale_factor)
     
-    # Use high-quality resampling
-    resized = screenshot.resize((new_width, new_height), Image.Resampling.LANCZOS)
+    # Use high-quality resampling (or the cheaper path for the requested quality)
+    resample, reducing_gap = RESIZE_QUALITY[quality]
 
-    if fit_mode == 'cover':
-        # Crop to target dimensions, centered on the image
-        left = max(0, (new_width - target_width) // 2)
-        top = max(0, (new_height - target_height) // 2)
-        right = left + target_width
-        bottom = top + target_height
+    if fit_mode != 'cover':
+        return screenshot.resize((new_width, new_height), resample, reducing_gap=reducing_gap)
 
-        # Ensure bounds stay within resized image (accounts for rounding)
-        if right > new_width:
-            left = max(0, new_width - target_width)
-            right = new_width
-        if bottom > new_height:
-            top = max(0, new_height - target_height)
-            bottom = new_height
+    # Crop to target dimensions, centered on the image
+    left = max(0, (new_width - target_width) // 2)
+    top = max(0, (new_height - target_height) // 2)
+    right = left + target_width
+    bottom = top + target_height
 
-        resized = resized.crop((left, top, right, bottom))
-    
-    return resized
+    # Ensure bounds stay within resized image (accounts for rounding)
+    if right > new_width:
+        left = max(0, new_width - target_width)
+        right = new_width
+    if bottom > new_height:
+        top = max(0, new_height - target_height)
+        bottom = new_height
+
+    # Resample only the source region that survives the crop. Pillow's box
+    # filter still reads neighbouring pixels outside the box, so the result
+    # matches resizing everything and cropping afterwards.
+    x_scale = img_width / new_width
+    y_scale = img_height / new_height
+    source_box = (left * x_scale, top * y_scale, right * x_scale, bottom * y_scale)
+    return screenshot.resize(
+        (right - left, bottom - top),
+        resample,
+        box=source_box,
+        reducing_gap=reducing_gap
+    )
+
+def to_composite_mode(screenshot):
+    """
+    Convert a screenshot to the mode compositing needs: 'RGBA' only when it
+    has transparency to blend, otherwise 'RGB' (no alpha band, or an alpha
+    band that is 255 everywhere). Opaque screenshots then resize without
+    premultiplying alpha and paste straight onto the frame. 'RGBX' (an RGB
+    image mapped from a SharedImagePool slot) is opaque and kept as is, so
+    the slot is not copied; it is resized and pasted like RGB.
+    """
+    if screenshot.mode in ('RGB', 'RGBX'):
+        return screenshot
+    if screenshot.mode in ('RGBA', 'LA', 'PA') or 'transparency' in screenshot.info:
+        if screenshot.mode != 'RGBA':
+            screenshot = screenshot.convert('RGBA')
+        if screenshot.getchannel('A').getextrema()[0] < 255:
+            return screenshot
+    return screenshot.convert('RGB')
 
-def add_screenshot_to_frame(frame, screenshot, screen_coords, device_config, filename=""):
+def add_screenshot_to_frame(frame, screenshot, screen_coords, device_config, filename="", quality='best', overlay_overrides=None, screen_mask=None):
     """
-    Adds the screenshot to the device frame
+    Adds the screenshot to the device frame, clipped to screen_mask if given
+    (see compose_screenshot_on_frame)
     """
     screen_x, screen_y, screen_width, screen_height = screen_coords
     fit_mode = device_config.get('fit_mode', 'contain')
     
-    # Convert screenshot to RGBA if it isn't already
-    if screenshot.mode != 'RGBA':
-        screenshot = screenshot.convert('RGBA')
+    # RGBA only if the screenshot has transparency, RGB otherwise
+    screenshot = to_composite_mode(screenshot)
     
     # Resize screenshot to fit screen
     resized_screenshot = resize_screenshot_to_fit(
@@ -462,42 +999,176 @@ def add_screenshot_to_frame(frame, screenshot, screen_coords, device_config, fil
         screen_width,
         screen_height,
         fit_mode=fit_mode,
-        filename=filename
+        filename=filename,
+        quality=quality
     )
     
+    return compose_screenshot_on_frame(frame, resized_screenshot, screen_coords, device_config, overlay_overrides, screen_mask)
+
+def _paste_in_bands(image, source, position, mask=None, band_rows=256):
+    """
+    image.paste(source, position, mask) a band of rows at a time. Pillow
+    converts a source in another mode (e.g. RGB onto the RGBA frame) to a
+    full-size copy first; bands keep that copy small.
+    """
+    x, y = position
+    for top in range(0, source.height, band_rows):
+        box = (0, top, source.width, min(source.height, top + band_rows))
+        band = source.crop(box)
+        if band.mode == 'RGBX' and image.mode == 'RGBA':
+            # The pad byte is 255, so the bytes already are opaque RGBA; this
+            # beats Pillow's RGBX -> RGBA conversion
+            band = Image.frombuffer('RGBA', band.size, band.tobytes(), 'raw', 'RGBA', 0, 1)
+        image.paste(band, (x, y + top), mask.crop(box) if mask is not None else None)
+
+def compose_screenshot_on_frame(frame, resized_screenshot, screen_coords, device_config, overlay_overrides=None, screen_mask=None):
+    """
+    Paste an already-resized screenshot onto a copy of the device frame
+    and apply the device overlay (with optional per-screenshot overrides).
+    RGB screenshots are copied in directly; RGBA ones are alpha-blended.
+
+    screen_mask is the device's L-mode screen mask (see get_screen_mask());
+    the screenshot is pasted through it in one pass, so its corners follow
+    the rounded screen instead of covering the bezel.
+    """
+    screen_x, screen_y, screen_width, screen_height = screen_coords
+    
     # Calculate position to center the screenshot
     paste_x = screen_x + (screen_width - resized_screenshot.width) // 2
     paste_y = screen_y + (screen_height - resized_screenshot.height) // 2
     
-    # Create a copy of the frame
-    result = frame.copy()
-    
-    # Paste screenshot onto frame
-    result.paste(resized_screenshot, (paste_x, paste_y), resized_screenshot)
-    
+    with timed_stage('paste'):
+        # Create a copy of the frame
+        result = frame.copy()
+
+        # Clip to the screen shape, keeping the screenshot's own transparency
+        mask = resized_screenshot if resized_screenshot.mode == 'RGBA' else None
+        if screen_mask is not None:
+            if resized_screenshot.size != screen_mask.size:
+                left, top = paste_x - screen_x, paste_y - screen_y
+                screen_mask = screen_mask.crop((left, top, left + resized_screenshot.width, top + resized_screenshot.height))
+            if mask is None:
+                mask = screen_mask
+            else:
+                mask = ImageChops.multiply(screen_mask, resized_screenshot.getchannel('A'))
+
+        # Paste screenshot onto frame
+        if resized_screenshot.mode == result.mode:
+            result.paste(resized_screenshot, (paste_x, paste_y), mask)
+        else:
+            _paste_in_bands(result, resized_screenshot, (paste_x, paste_y), mask)
+
     # Apply optional overlays (e.g., platform UI chrome)
-    apply_overlay(result, screen_coords, device_config)
+    with timed_stage('overlay'):
+        apply_overlay(result, screen_coords, device_config, overlay_overrides)
     
     return result
 
-def apply_overlay(image, screen_coords, device_config):
+def apply_overlay(image, screen_coords, device_config, overrides=None):
     """
     Apply device-specific overlay UI decorations.
+    overrides: Optional per-screenshot overlay_settings values (e.g. cta_text)
     """
     overlay_type = device_config.get('overlay_type')
     if not overlay_type:
         return
     
     if overlay_type == 'instagram_story':
-        apply_instagram_story_overlay(image, screen_coords, device_config)
+        apply_instagram_story_overlay(image, screen_coords, device_config, overrides)
+
+# Instagram story text fields that can vary per screenshot
+# without re-rendering the cached overlay layer (they don't move other elements)
+STORY_DYNAMIC_FIELDS = ('brand_text', 'cta_text', 'cta_subtext')
+# The order draw_instagram_story_overlay() draws its parts in; later parts
+# cover earlier ones where they overlap
+STORY_DRAW_ORDER = (
+    'top_band', 'progress_bar', 'brand_text', 'subtitle_text', 'menu_dots',
+    'bottom_band', 'cta_pill', 'cta_text', 'cta_subtext', 'icons'
+)
+OVERLAY_CACHE_SIZE = 32
+
+@lru_cache(maxsize=OVERLAY_CACHE_SIZE)
+def _instagram_story_layer(screen_width, screen_height, settings_json, parts):
+    """
+    Render parts of the story overlay (the ones drawn before the first
+    per-screenshot text) once into a screen-sized RGBA layer.
+
+    Returns:
+        List of (offset, layer piece, mask piece) strips covering the rows the
+        overlay drew on; mask is None where the strip is fully covered
+    """
+    from PIL import ImageDraw
+
+    # One extra row/column: ImageDraw rectangles include their right/bottom edge
+    layer = Image.new('RGBA', (screen_width + 1, screen_height + 1), (0, 0, 0, 0))
+    draw_instagram_story_overlay(
+        ImageDraw.Draw(layer, 'RGBA'),
+        (0, 0, screen_width, screen_height),
+        json.loads(settings_json),
+        parts=parts
+    )
+    mask = layer.getchannel('A').point(lambda alpha: 255 if alpha else 0)
+
+    # Split into horizontal strips of drawn rows so untouched rows (most of
+    # the screenshot) are never copied, and solid strips skip the mask
+    _, row_coverage = mask.getprojection()
+    strips = []
+    top = None
+    for y, coverage in enumerate(list(row_coverage) + [0]):
+        if coverage and top is None:
+            top = y
+        elif not coverage and top is not None:
+            box = (0, top, layer.width, y)
+            strip_mask = mask.crop(box)
+            if strip_mask.getextrema() == (255, 255):
+                strip_mask = None
+            strips.append(((0, top), layer.crop(box), strip_mask))
+            top = None
+    return strips
 
-def apply_instagram_story_overlay(image, screen_coords, device_config):
+def apply_instagram_story_overlay(image, screen_coords, device_config, overrides=None):
     """
     Draw Instagram-style story UI chrome on top of the screenshot.
+
+    The chrome is pre-rendered once per settings into a cached layer and
+    applied with a masked paste per drawn strip. ImageDraw writes RGBA fills straight
+    into RGBA images, so the paste reproduces exactly what drawing on the
+    mockup gave. Overridden brand/CTA texts, and every part drawn after the
+    first of them, are drawn per screenshot, so they stack as before; other
+    overrides get their own cached layer.
+    """
+    screen_x, screen_y, screen_width, screen_height = screen_coords
+    settings = dict(device_config.get('overlay_settings', {}))
+    overrides = overrides or {}
+    settings.update(overrides)
+
+    dynamic_fields = [field for field in STORY_DYNAMIC_FIELDS if field in overrides]
+    static_settings = {k: v for k, v in settings.items() if k not in dynamic_fields}
+    first_dynamic = min((STORY_DRAW_ORDER.index(field) for field in dynamic_fields), default=len(STORY_DRAW_ORDER))
+    strips = _instagram_story_layer(
+        screen_width,
+        screen_height,
+        json.dumps(static_settings, sort_keys=True),
+        STORY_DRAW_ORDER[:first_dynamic]
+    )
+    for (offset_x, offset_y), piece, mask in strips:
+        image.paste(piece, (screen_x + offset_x, screen_y + offset_y), mask)
+
+    if dynamic_fields:
+        from PIL import ImageDraw
+        draw_instagram_story_overlay(
+            ImageDraw.Draw(image, 'RGBA'),
+            screen_coords,
+            settings,
+            parts=STORY_DRAW_ORDER[first_dynamic:]
+        )
+
+def draw_instagram_story_overlay(draw, screen_coords, settings, parts=STORY_DRAW_ORDER):
+    """
+    Draw the Instagram story chrome with an RGBA ImageDraw.
+    parts: Which of STORY_DRAW_ORDER to draw (always in that order)
     """
-    draw = ImageDraw.Draw(image, 'RGBA')
     screen_x, screen_y, screen_width, screen_height = screen_coords
-    settings = device_config.get('overlay_settings', {})
     
     brand_text = settings.get('brand_text', 'Your Brand • Sponsored')
     subtitle_text = settings.get('subtitle_text', '')
@@ -516,7 +1187,8 @@ def apply_instagram_story_overlay(image, screen_coords, device_config):
         screen_x + screen_width,
         screen_y + top_height
     ]
-    draw.rectangle(top_rect, fill=(0, 0, 0, 150))
+    if 'top_band' in parts:
+        draw.rectangle(top_rect, fill=(0, 0, 0, 150))
     
     # Story progress bar
     bar_margin = int(screen_width * 0.05)
@@ -528,9 +1200,10 @@ def apply_instagram_story_overlay(image, screen_coords, device_config):
         screen_x + screen_width - bar_margin,
         bar_y + bar_height
     ]
-    draw.rounded_rectangle(bar_rect, radius=bar_height // 2, fill=(100, 100, 100, 180))
+    if 'progress_bar' in parts:
+        draw.rounded_rectangle(bar_rect, radius=bar_height // 2, fill=(100, 100, 100, 180))
     progress_width = int((bar_rect[2] - bar_rect[0]) * progress_fraction)
-    if progress_width > 0:
+    if 'progress_bar' in parts and progress_width > 0:
         progress_rect = [
             bar_rect[0],
             bar_rect[1],
@@ -543,30 +1216,33 @@ def apply_instagram_story_overlay(image, screen_coords, device_config):
     brand_font = load_font(int(screen_width * 0.05), bold=True)
     subtitle_font = load_font(int(screen_width * 0.035))
     text_y = bar_rect[3] + int(top_height * 0.15)
-    draw.text(
-        (screen_x + side_padding, text_y),
-        brand_text,
-        font=brand_font,
-        fill=(255, 255, 255, 255)
-    )
+    if 'brand_text' in parts:
+        draw.text(
+            (screen_x + side_padding, text_y),
+            brand_text,
+            font=brand_font,
+            fill=(255, 255, 255, 255)
+        )
     if subtitle_text:
+        # The subtitle always drives the layout (menu dots sit relative to it)
         subtitle_lines = wrap_text(subtitle_text, subtitle_font, screen_width - 2 * side_padding)
         for line in subtitle_lines:
             _, line_height = _text_size(subtitle_font, line)
             text_y += line_height + int(screen_height * 0.005)
-            draw.text(
-                (screen_x + side_padding, text_y),
-                line,
-                font=subtitle_font,
-                fill=(230, 230, 230, 255)
-            )
+            if 'subtitle_text' in parts:
+                draw.text(
+                    (screen_x + side_padding, text_y),
+                    line,
+                    font=subtitle_font,
+                    fill=(230, 230, 230, 255)
+                )
     
     # Top right menu dots
     dot_radius = max(4, int(screen_width * 0.008))
     dots_center_y = text_y - int(top_height * 0.3)
     dots_spacing = dot_radius * 3
     dots_x_start = screen_x + screen_width - side_padding - dots_spacing
-    for i in range(3):
+    for i in range(3 if 'menu_dots' in parts else 0):
         cx = dots_x_start + i * dot_radius
         draw.ellipse(
             [
@@ -585,32 +1261,35 @@ def apply_instagram_story_overlay(image, screen_coords, device_config):
         screen_x + screen_width,
         screen_y + screen_height
     ]
-    draw.rectangle(bottom_rect, fill=(0, 0, 0, 170))
+    if 'bottom_band' in parts:
+        draw.rectangle(bottom_rect, fill=(0, 0, 0, 170))
     
     # CTA pill
     cta_width = int(screen_width * 0.45)
     cta_height = int(bottom_height * 0.35)
     cta_x = screen_x + side_padding
     cta_y = bottom_rect[1] + int(bottom_height * 0.18)
-    draw.rounded_rectangle(
-        [cta_x, cta_y, cta_x + cta_width, cta_y + cta_height],
-        radius=cta_height // 2,
-        fill=(255, 255, 255, 230)
-    )
+    if 'cta_pill' in parts:
+        draw.rounded_rectangle(
+            [cta_x, cta_y, cta_x + cta_width, cta_y + cta_height],
+            radius=cta_height // 2,
+            fill=(255, 255, 255, 230)
+        )
     
-    cta_font = load_font(int(screen_width * 0.045), bold=True)
-    text_width, text_height = _text_size(cta_font, cta_text)
-    text_x = cta_x + (cta_width - text_width) // 2
-    text_y = cta_y + (cta_height - text_height) // 2
-    draw.text(
-        (text_x, text_y),
-        cta_text,
-        font=cta_font,
-        fill=(0, 0, 0, 255)
-    )
+    if 'cta_text' in parts:
+        cta_font = load_font(int(screen_width * 0.045), bold=True)
+        text_width, text_height = _text_size(cta_font, cta_text)
+        text_x = cta_x + (cta_width - text_width) // 2
+        text_y = cta_y + (cta_height - text_height) // 2
+        draw.text(
+            (text_x, text_y),
+            cta_text,
+            font=cta_font,
+            fill=(0, 0, 0, 255)
+        )
     
     # CTA subtext / URL
-    if cta_subtext:
+    if cta_subtext and 'cta_subtext' in parts:
         sub_font = load_font(int(screen_width * 0.035))
         sub_y = cta_y + cta_height + int(bottom_height * 0.12)
         draw.text(
@@ -620,6 +1299,9 @@ def apply_instagram_story_overlay(image, screen_coords, device_config):
             fill=(220, 220, 220, 255)
         )
     
+    if 'icons' not in parts:
+        return
+    
     # Engagement icons on the right (share, like)
     icon_radius = int(bottom_height * 0.22)
     icon_spacing = int(bottom_height * 0.35)
@@ -647,134 +1329,2595 @@ def apply_instagram_story_overlay(image, screen_coords, device_config):
     draw.line(arrow_points, fill=(255, 255, 255, 220), width=4)
     draw.line([(icon_x, arrow_center_y + arrow_height), (icon_x, arrow_center_y + arrow_height + icon_radius)], fill=(255, 255, 255, 220), width=4)
 
-def process_all_screenshots(input_folder='./screenshots', output_folder='./mockups', device_type='iphone14', skip_existing=True, auto_trim=True):
+def resolve_output_format(device_type, output_format=None):
     """
-    Process all screenshots in the input folder and create mockups
-
-    Args:
-        input_folder: Path to folder containing screenshots
-        output_folder: Path to save generated mockups
-        device_type: Device frame to use (e.g., 'iphone14', 'macbook14')
-        skip_existing: Skip screenshots that already have mockups
-        auto_trim: Automatically remove white/light borders from screenshots
+    Pick the output encoder: the run-level choice, else the device's
+    'output_format', else DEFAULT_OUTPUT_FORMAT.
     """
-    # Validate device type
-    if device_type not in DEVICES:
-        print(f"❌ Invalid device type: '{device_type}'")
-        print(f"   Available devices: {', '.join(DEVICES.keys())}")
-        return
+    name = (output_format or DEVICES[device_type].get('output_format') or DEFAULT_OUTPUT_FORMAT).lower()
+    if name not in OUTPUT_FORMATS:
+        raise ValueError(f"Output format '{name}' not supported. Choose from: {', '.join(OUTPUT_FORMATS.keys())}")
+    return name
 
-    # Create output folder if it doesn't exist
-    Path(output_folder).mkdir(parents=True, exist_ok=True)
+def mockup_filename(name_without_ext, device_type, output_format=DEFAULT_OUTPUT_FORMAT):
+    """
+    Output filename for a screenshot rendered on a device.
+    """
+    return f"{name_without_ext}_{device_type}_mockup{OUTPUT_FORMATS[output_format]['extension']}"
 
-    # Supported image formats
-    supported_formats = ('.png', '.jpg', '.jpeg', '.webp')
+def encode_mockup(mockup, output=None, output_format=DEFAULT_OUTPUT_FORMAT):
+    """
+    Encode a mockup with one of the OUTPUT_FORMATS presets.
 
-    # Get all image files from input folder
-    screenshot_files = [f for f in os.listdir(input_folder)
-                       if f.lower().endswith(supported_formats)]
+    Args:
+        mockup: RGBA PIL Image
+        output: Path or writable file object; if None the bytes are returned
+        output_format: Key of OUTPUT_FORMATS
 
-    if not screenshot_files:
-        print(f"❌ No image files found in '{input_folder}'")
-        print(f"   Supported formats: {', '.join(supported_formats)}")
-        return
+    Returns:
+        Encoded bytes when output is None, otherwise None
+    """
+    preset = OUTPUT_FORMATS[output_format]
+    with timed_stage('save'):
+        if mockup.mode == 'RGBX' and (preset.get('palette') or preset['format'] not in ('WEBP', 'JPEG')):
+            # A mockup read from a shared slot; PNG and quantize() need RGB
+            mockup = mockup.convert('RGB')
+        if preset.get('palette'):
+            # FASTOCTREE is the quantizer that keeps the alpha channel
+            mockup = mockup.quantize(256, method=Image.Quantize.FASTOCTREE)
 
-    device_name = DEVICES[device_type]['name']
-    print(f"📱 Found {len(screenshot_files)} screenshot(s) to process...")
-    print(f"🖥️  Device: {device_name}")
-    if auto_trim:
-        print("✂️  Auto-trim: ON (removing white borders)")
-    if skip_existing:
-        print("⏭️  Skipping screenshots with existing mockups.")
-    print("-" * 50)
+        if output is None:
+            buffer = io.BytesIO()
+            mockup.save(buffer, preset['format'], **preset['options'])
+            return buffer.getvalue()
+        if isinstance(output, (str, os.PathLike)) and os.path.isfile(output) and os.stat(output).st_nlink > 1:
+            # A dedupe hardlink: write a new file rather than through the link
+            os.remove(output)
+        mockup.save(output, preset['format'], **preset['options'])
+    return None
 
-    # Create device frame template
-    frame_template, screen_coords, device_config = create_device_frame(device_type)
+def normalize_scales(scales):
+    """
+    Validate a run's output scales: factors in (0, 1] and 'thumb'.
 
-    # Process each screenshot
-    processed_count = 0
-    skipped_count = 0
-    trimmed_count = 0
+    Returns:
+        The smaller variants to save besides the full-size mockup, which is
+        always saved, without duplicates (e.g. (0.5, 'thumb'))
 
-    for idx, filename in enumerate(screenshot_files, 1):
-        try:
-            input_path = os.path.join(input_folder, filename)
-            name_without_ext = os.path.splitext(filename)[0]
-            output_filename = f"{name_without_ext}_{device_type}_mockup.png"
-            output_path = os.path.join(output_folder, output_filename)
-
-            if skip_existing and os.path.exists(output_path):
-                skipped_count += 1
-                print(f"   Skipping existing mockup: {output_filename}")
+    Raises:
+        ValueError: For anything else
+    """
+    variants = []
+    for scale in scales or ():
+        if isinstance(scale, str) and scale.strip().lower() == 'thumb':
+            scale = 'thumb'
+        else:
+            scale = float(scale)
+            if not 0 < scale <= 1:
+                raise ValueError(f"output scale {scale:g} is not between 0 and 1")
+            if scale == 1:
                 continue
+        if scale not in variants:
+            variants.append(scale)
+    return tuple(variants)
 
-            # Load screenshot
-            screenshot = Image.open(input_path)
-            original_size = screenshot.size
-
-            # Auto-trim white borders if enabled
-            if auto_trim:
-                screenshot = auto_trim_whitespace(screenshot)
-                trimmed_size = screenshot.size
-                if trimmed_size != original_size:
-                    trimmed_count += 1
-                    print(f"   ✂️  Trimmed: {original_size[0]}x{original_size[1]} → {trimmed_size[0]}x{trimmed_size[1]}")
-                else:
-                    print(f"   Processing: {screenshot.size[0]}x{screenshot.size[1]} pixels")
-            else:
-                print(f"   Processing: {screenshot.size[0]}x{screenshot.size[1]} pixels")
+def variant_path(output_path, scale):
+    """
+    Path of a smaller variant of a mockup: name@0.5x.png or name_thumb.png.
+    """
+    stem, ext = os.path.splitext(output_path)
+    return f"{stem}_thumb{ext}" if scale == 'thumb' else f"{stem}@{scale:g}x{ext}"
+
+def _variant_size(size, scale):
+    if scale == 'thumb':
+        scale = min(THUMBNAIL_SIZE[0] / size[0], THUMBNAIL_SIZE[1] / size[1], 1)
+    return max(1, round(size[0] * scale)), max(1, round(size[1] * scale))
+
+def _encode_on_thread(mockup, output_path, output_format):
+    # Pool threads have no timings collector; return the CPU seconds instead
+    timings = {}
+    with collect_timings(timings):
+        encode_mockup(mockup, output_path, output_format)
+    return timings['save']['cpu']
+
+def encode_mockup_variants(mockup, output_path, output_format=DEFAULT_OUTPUT_FORMAT, scales=(), save_full_size=True):
+    """
+    Save a mockup and its smaller variants from the one composed image.
+
+    Each variant is shrunk from the next larger one rather than from the
+    full-size mockup (a box reduce for exact steps such as 0.5x, LANCZOS
+    otherwise), and all of them are encoded on parallel threads
+    (Pillow releases the GIL while encoding), so an extra size costs a
+    fraction of a render.
+
+    Args:
+        scales: Variants from normalize_scales(); none saves just output_path
+        save_full_size: False saves only the variants, for a mockup already
+                        on disk (see complete_mockup_variants())
+
+    Returns:
+        Paths of the saved variants, largest first
+    """
+    if not scales:
+        if save_full_size:
+            encode_mockup(mockup, output_path, output_format)
+        return []
+
+    from concurrent.futures import ThreadPoolExecutor
+    variants = sorted(((_variant_size(mockup.size, scale), scale) for scale in scales), key=lambda item: item[0][0] * item[0][1], reverse=True)
+    paths = []
+    with timed_stage('save'):
+        with ThreadPoolExecutor(max_workers=len(variants) + 1) as executor:
+            futures = [executor.submit(_encode_on_thread, mockup, output_path, output_format)] if save_full_size else []
+            image = mockup
+            for size, scale in variants:
+                factor = image.width // size[0]
+                if factor > 1 and image.size == (size[0] * factor, size[1] * factor):
+                    # Exact steps such as 1x -> 0.5x: a box reduce is ~4x faster than LANCZOS
+                    image = image.reduce(factor)
+                elif image.size != size:
+                    image = image.resize(size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+                paths.append(variant_path(output_path, scale))
+                futures.append(executor.submit(_encode_on_thread, image, paths[-1], output_format))
+            encode_cpu = sum(future.result() for future in futures)
+    timings = getattr(_TIMINGS, 'current', None)
+    if timings is not None:
+        timings['save']['cpu'] += encode_cpu
+    return paths
+
+def complete_mockup_variants(output_path, output_format, scales):
+    """
+    Save missing variants of an up-to-date mockup from its full-size file,
+    so adding a size to --scales neither recomposes nor re-encodes it.
+
+    Returns:
+        Paths of the saved variants, largest first
+    """
+    with Image.open(output_path) as mockup:
+        if mockup.mode not in ('RGB', 'RGBA'):
+            mockup = mockup.convert('RGBA')  # e.g. png-palette output
+        mockup.load()
+        return encode_mockup_variants(mockup, output_path, output_format, scales, save_full_size=False)
+
+def variant_key(scale):
+    """
+    How a variant is listed in a manifest entry's 'variants'.
+    """
+    return f"thumb{THUMBNAIL_SIZE[0]}x{THUMBNAIL_SIZE[1]}" if scale == 'thumb' else f"{scale:g}x"
+
+def load_manifest(output_folder):
+    """
+    Load the incremental-build manifest from the output folder.
+    Returns an empty manifest if it is missing or unreadable.
+    """
+    manifest_path = os.path.join(output_folder, MANIFEST_FILENAME)
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if isinstance(manifest.get('entries'), dict):
+            return manifest
+    except (OSError, ValueError, AttributeError):
+        pass
+    return {'version': 1, 'entries': {}}
+
+def save_manifest(output_folder, manifest):
+    """
+    Atomically write the incremental-build manifest to the output folder.
+    """
+    manifest_path = os.path.join(output_folder, MANIFEST_FILENAME)
+    temp_path = f"{manifest_path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(temp_path, manifest_path)
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """
+    SHA-256 hex digest of a file's bytes.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def source_fingerprint(path, previous_entry=None):
+    """
+    Return (size, mtime_ns, sha256) for a source file. The hash recorded in
+    previous_entry is reused when size and mtime are unchanged, so unchanged
+    files are not re-read.
+    """
+    stat = os.stat(path)
+    if (previous_entry
+            and previous_entry.get('source_size') == stat.st_size
+            and previous_entry.get('source_mtime_ns') == stat.st_mtime_ns
+            and previous_entry.get('source_hash')):
+        return stat.st_size, stat.st_mtime_ns, previous_entry['source_hash']
+    return stat.st_size, stat.st_mtime_ns, file_sha256(path)
+
+def build_fingerprint(source_hash, device_type, auto_trim, quality='best', output_format=DEFAULT_OUTPUT_FORMAT, overlay_overrides=None):
+    """
+    Hash everything that determines a mockup's output: source bytes, device
+    config, trim parameters, resampling quality, encoder, per-screenshot
+    overlay overrides and generator version. Extra output sizes are tracked
+    separately (a manifest entry's 'variants'), so changing them does not
+    invalidate the full-size mockup.
+    """
+    fields = {
+        'source': source_hash,
+        'device': device_config_hash(device_type),
+        'trim': [bool(auto_trim), TRIM_THRESHOLD, TRIM_MIN_CONTENT_RATIO],
+        'generator': GENERATOR_VERSION
+    }
+    # Only non-default settings are added, so existing fingerprints stay valid
+    if quality != 'best':
+        fields['quality'] = quality
+    if output_format != DEFAULT_OUTPUT_FORMAT:
+        fields['output_format'] = output_format
+    if overlay_overrides and DEVICES[device_type].get('overlay_type'):
+        fields['overlay_overrides'] = overlay_overrides
+    payload = json.dumps(fields, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def dhash(source, hash_size=DEDUPE_HASH_SIZE):
+    """
+    Difference hash of an image: one bit per neighbouring pixel pair of a
+    (hash_size + 1) x hash_size grayscale thumbnail, set where brightness
+    drops to the right. Re-encodes, small resizes and retouches flip few
+    bits, so near-identical screenshots have a small hash_distance().
+
+    Args:
+        source: Path, file object or PIL Image
+
+    Returns:
+        hash_size² bit integer
+    """
+    opened = not isinstance(source, Image.Image)
+    with Image.open(source) if opened else contextlib.nullcontext(source) as image:
+        if opened:
+            # The thumbnail only needs a fraction of the pixels: JPEGs decode at 1/8
+            image.draft('L', ((hash_size + 1) * 8, hash_size * 8))
+        if image.mode not in ('L', 'RGB'):
+            image = image.convert('L')
+        thumb = image.resize((hash_size + 1, hash_size), Image.Resampling.BOX).convert('L')
+    pixels = thumb.tobytes()
+
+    bits = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return bits
+
+def hash_distance(hash_a, hash_b):
+    """
+    Number of differing bits (Hamming distance) between two dhash() values.
+    """
+    return bin(hash_a ^ hash_b).count('1')
+
+def dedupe_signature(source, auto_trim=True):
+    """
+    What dedupe compares for a screenshot: its dhash(), plus the aspect
+    ratio and mean colour of its content, taken from a probe at most
+    DEDUPE_PROBE_SIZE px long. With auto_trim the content is the probe
+    trimmed the way rendering would trim it.
 
-            # Add to frame
-            mockup = add_screenshot_to_frame(
-                frame_template,
+    Args:
+        source: Path, file object or PIL Image
+
+    Returns:
+        {'hash': hex dhash, 'aspect': width / height, 'color': [r, g, b],
+        'trim': auto_trim}, JSON-ready for the manifest
+    """
+    opened = not isinstance(source, Image.Image)
+    with Image.open(source) if opened else contextlib.nullcontext(source) as image:
+        if opened:
+            image.draft('RGB', (DEDUPE_PROBE_SIZE, DEDUPE_PROBE_SIZE))
+        width, height = image.size
+        factor = max(image.size) // DEDUPE_PROBE_SIZE
+        probe = image.reduce(factor) if factor > 1 and image.mode in REDUCIBLE_MODES else image
+        if probe.mode in ('LA', 'PA') or 'transparency' in probe.info:
+            probe = probe.convert('RGBA')
+        if probe.mode == 'RGBA':
+            # Transparent areas count as white, as they do for auto-trim
+            flat = Image.new('RGB', probe.size, (255, 255, 255))
+            flat.paste(probe, mask=probe.getchannel('A'))
+            probe = flat
+        elif probe.mode != 'RGB':
+            probe = probe.convert('RGB')
+        probe.load()
+
+    scale_x, scale_y = width / probe.width, height / probe.height
+    content = probe
+    if auto_trim:
+        box = find_trim_box(probe)
+        if box:
+            content = probe.crop(box)
+    return {
+        'hash': f"{dhash(probe):0{DEDUPE_HASH_SIZE * DEDUPE_HASH_SIZE // 4}x}",
+        'aspect': round(content.width * scale_x / (content.height * scale_y), 4),
+        'color': list(content.resize((1, 1), Image.Resampling.BOX).getpixel((0, 0))),
+        'trim': bool(auto_trim)
+    }
+
+def signature_distance(signature_a, signature_b):
+    """
+    Differing hash bits between two dedupe_signature() values, or None when
+    their aspect ratios or mean colours are too far apart to be duplicates.
+    """
+    aspect_a, aspect_b = signature_a['aspect'], signature_b['aspect']
+    if abs(aspect_a - aspect_b) > DEDUPE_ASPECT_TOLERANCE * max(aspect_a, aspect_b):
+        return None
+    if max(abs(a - b) for a, b in zip(signature_a['color'], signature_b['color'])) > DEDUPE_COLOR_TOLERANCE:
+        return None
+    return hash_distance(int(signature_a['hash'], 16), int(signature_b['hash'], 16))
+
+def source_signature(path, auto_trim=True, previous_entries=()):
+    """
+    dedupe_signature() of a source file. A 'source_dedupe' recorded in one
+    of previous_entries (manifest entries for the same source bytes) with
+    the same trim setting is reused, so unchanged files are not decoded again.
+    """
+    for entry in previous_entries:
+        recorded = entry.get('source_dedupe') if entry else None
+        if recorded and recorded.get('trim') == bool(auto_trim) and len(recorded.get('hash', '')) == DEDUPE_HASH_SIZE * DEDUPE_HASH_SIZE // 4:
+            return recorded
+    return dedupe_signature(path, auto_trim)
+
+def _link_or_copy(source_path, output_path):
+    """
+    Hardlink output_path to source_path, copying where links are not
+    possible (other filesystem, no hardlink support).
+    """
+    if os.path.abspath(source_path) == os.path.abspath(output_path):
+        return  # Same mockup name, e.g. shot.png and shot.jpg
+    if os.path.lexists(output_path):
+        os.remove(output_path)
+    try:
+        os.link(source_path, output_path)
+    except OSError:
+        shutil.copy2(source_path, output_path)
+
+def prepare_screenshot(screenshot, auto_trim=True):
+    """
+    Trim white borders (optionally) and convert to RGB or RGBA (see
+    to_composite_mode()), ready for render_device_mockup().
+
+    Returns:
+        (prepared screenshot, original size)
+    """
+    original_size = screenshot.size
+    with timed_stage('trim'):
+        if auto_trim:
+            screenshot = auto_trim_whitespace(screenshot)
+        screenshot = to_composite_mode(screenshot)
+    return screenshot, original_size
+
+def load_screenshot(source, device_types=(), auto_trim=True, quality='best', memory_budget_mb=None):
+    """
+    Open, decode and prepare a screenshot (see prepare_screenshot()).
+
+    Sources over LARGE_IMAGE_PIXELS, or whose normal decode would not fit
+    memory_budget_mb, go through large-image mode: they are trimmed on a
+    reduced probe and returned at the working resolution, so original_size is
+    the untrimmed size at that resolution.
+
+    Returns:
+        (prepared screenshot, original size)
+    """
+    with timed_stage('open'):
+        screenshot = open_screenshot(source, device_types, quality)
+    if not isinstance(source, Image.Image) and _use_large_image_mode(screenshot, auto_trim, memory_budget_mb):
+        return _load_large_screenshot(screenshot, device_types, auto_trim, memory_budget_mb)
+    with timed_stage('open'):
+        screenshot.load()
+    return prepare_screenshot(screenshot, auto_trim)
+
+def render_device_mockup(screenshot, device_type, resized_cache=None, filename="", quality='best', overlay_overrides=None):
+    """
+    Compose a prepared screenshot into a device frame, clipped to the
+    device's cached screen mask.
+
+    Pass the same resized_cache dict for every device of one screenshot to
+    share resized images between devices with the same screen size and fit mode.
+    """
+    frame_template, screen_coords, device_config = get_device_frame(device_type)
+    screen_width, screen_height = screen_coords[2], screen_coords[3]
+    fit_mode = device_config.get('fit_mode', 'contain')
+
+    # Resize once per (screen size, fit mode)
+    resize_key = (screen_width, screen_height, fit_mode)
+    if resized_cache is None:
+        resized_cache = {}
+    if resize_key not in resized_cache:
+        with timed_stage('resize'):
+            resized_cache[resize_key] = resize_screenshot_to_fit(
                 screenshot,
-                screen_coords,
-                device_config,
-                filename
+                screen_width,
+                screen_height,
+                fit_mode=fit_mode,
+                filename=filename,
+                quality=quality
             )
 
-            # Save mockup
-            mockup.save(output_path, 'PNG')
+    return compose_screenshot_on_frame(
+        frame_template,
+        resized_cache[resize_key],
+        screen_coords,
+        device_config,
+        overlay_overrides,
+        get_screen_mask(device_type)
+    )
+
+def _mockup_result(filename, device_type, output_path):
+    """
+    Fresh per-mockup result dict, as returned by render_screenshot_file().
+    """
+    return {
+        'filename': filename,
+        'device_type': device_type,
+        'output_filename': os.path.basename(output_path),
+        'status': 'processed',
+        'trimmed': False,
+        'original_size': None,
+        'size': None,
+        'error': None,
+        'variant_filenames': [],
+        'file_timings': {},
+        'timings': {},
+        'peak_rss_mb': None
+    }
+
+def _note_peak_rss(result):
+    """
+    Set result['peak_rss_mb'] to the highest stage peak of its screenshot
+    and mockup (see collect_timings(memory=True)); None if not measured.
+    """
+    peaks = [entry['peak_rss_mb'] for timings in (result['file_timings'], result['timings'])
+             for entry in timings.values() if 'peak_rss_mb' in entry]
+    result['peak_rss_mb'] = max(peaks) if peaks else None
+
+def _load_screenshot_file(input_path, targets, auto_trim, quality, memory_budget_mb=None):
+    """
+    Decode and prepare a screenshot for the given targets, printing the
+    trim/processing line.
+    """
+    # Load screenshot, auto-trimming white borders if enabled
+    device_types = [target[0] for target in targets]
+    screenshot, original_size = load_screenshot(input_path, device_types, auto_trim, quality, memory_budget_mb)
+    _print_prepared(original_size, screenshot.size)
+    return screenshot, original_size
+
+def _print_prepared(original_size, size):
+    if size != original_size:
+        print(f"   ✂️  Trimmed: {original_size[0]}x{original_size[1]} → {size[0]}x{size[1]}")
+    else:
+        print(f"   Processing: {size[0]}x{size[1]} pixels")
+
+def render_screenshot_file(input_path, targets, auto_trim=True, quality='best', overlay_overrides=None, memory_budget_mb=None, tile_size=None, scales=()):
+    """
+    Render a single screenshot file into one or more device mockups.
+
+    The source is decoded and trimmed once; resized screenshots are shared
+    between devices with the same screen size and fit mode.
+
+    Args:
+        input_path: Path to the screenshot
+        targets: List of (device_type, output_path, output_format) tuples
+        auto_trim: Automatically remove white/light borders
+        quality: Resampling mode, 'best', 'fast' or 'preview' (see RESIZE_QUALITY)
+        overlay_overrides: Optional overlay_settings values for this screenshot
+        memory_budget_mb: Optional decode budget; larger screenshots use
+                          large-image mode (see load_screenshot()) or fail
+        tile_size: Optional (width, height); each processed result then also
+                   has a 'tile', the mockup downscaled by mockup_tile() for
+                   a ContactSheet
+        scales: Extra output sizes from normalize_scales(), saved next to
+                each mockup by encode_mockup_variants()
 
-            processed_count += 1
-            print(f"✅ [{idx}/{len(screenshot_files)}] {filename} → {output_filename}")
+    Returns:
+        List of result dicts, one per target, with 'status' ('processed' or
+        'error'), 'trimmed', the original and final sizes, 'error',
+        'variant_filenames' (the extra sizes saved), and
+        instrumentation: 'file_timings' (the screenshot's 'open' and 'trim'
+        stages, shared by its devices), 'timings' (this mockup's other
+        TIMED_STAGES) and 'peak_rss_mb', the highest RSS of this process
+        during those stages (the caller must not render on other threads
+        meanwhile)
+    """
+    filename = os.path.basename(input_path)
+    results = [_mockup_result(filename, device_type, output_path) for device_type, output_path, _ in targets]
+    file_timings = {}
+    for result in results:
+        result['file_timings'] = file_timings
+
+    try:
+        with collect_timings(file_timings, memory=True):
+            screenshot, original_size = _load_screenshot_file(input_path, targets, auto_trim, quality, memory_budget_mb)
+        trimmed = screenshot.size != original_size
+    except Exception as e:
+        for result in results:
+            result['status'] = 'error'
+            result['error'] = str(e)
+        return results
 
+    resized_cache = {}
+    for result, (device_type, output_path, output_format) in zip(results, targets):
+        result['original_size'] = original_size
+        result['size'] = screenshot.size
+        result['trimmed'] = trimmed
+        try:
+            with collect_timings(result['timings'], memory=True):
+                mockup = render_device_mockup(screenshot, device_type, resized_cache, filename, quality, overlay_overrides)
+
+                # Save mockup
+                variants = encode_mockup_variants(mockup, output_path, output_format, scales)
+            result['variant_filenames'] = [os.path.basename(path) for path in variants]
+            if tile_size:
+                result['tile'] = mockup_tile(mockup, tile_size)
         except Exception as e:
-            print(f"❌ [{idx}/{len(screenshot_files)}] Error processing {filename}: {str(e)}")
-    
+            result['status'] = 'error'
+            result['error'] = str(e)
+        _note_peak_rss(result)
+
+    return results
+
+def _render_stream_item(name, source, device_types, auto_trim, output_format, quality, overlay_overrides=None, memory_budget_mb=None):
+    """
+    Render one in-memory screenshot for stream_mockups(); returns a list of
+    (name, encoded bytes or None, metadata) tuples.
+    """
+    outputs = []
+    file_timings = {}
+    try:
+        with collect_timings(file_timings):
+            screenshot, original_size = load_screenshot(source, device_types, auto_trim, quality, memory_budget_mb)
+    except Exception as e:
+        for device_type in device_types:
+            outputs.append((name, None, {'device_type': device_type, 'status': 'error', 'error': str(e)}))
+        return outputs
+
+    resized_cache = {}
+    for device_type in device_types:
+        metadata = {
+            'device_type': device_type,
+            'status': 'processed',
+            'format': resolve_output_format(device_type, output_format),
+            'trimmed': screenshot.size != original_size,
+            'original_size': original_size,
+            'size': screenshot.size,
+            'mockup_size': None,
+            'error': None,
+            'file_timings': file_timings,
+            'timings': {}
+        }
+        try:
+            with collect_timings(metadata['timings']):
+                mockup = render_device_mockup(screenshot, device_type, resized_cache, name, quality, overlay_overrides)
+                data = encode_mockup(mockup, output_format=metadata['format'])
+            metadata['mockup_size'] = mockup.size
+            outputs.append((name, data, metadata))
+        except Exception as e:
+            metadata['status'] = 'error'
+            metadata['error'] = str(e)
+            outputs.append((name, None, metadata))
+    return outputs
+
+def stream_mockups(items, device_type='iphone14', auto_trim=True, output_format=None, workers=1, quality='best', memory_budget_mb=None):
+    """
+    Lazily render in-memory screenshots without touching the disk.
+
+    Args:
+        items: Iterable of (name, source) or (name, source, overlay_overrides)
+               tuples; source is encoded image bytes or a PIL Image
+        device_type: Device id, or a list of device ids to render each item into
+        auto_trim: Automatically remove white/light borders
+        output_format: Key of OUTPUT_FORMATS (default: per device, else PNG)
+        workers: Number of render threads; at most 2 * workers items are in
+                 flight, so memory stays bounded however long the input is
+        quality: Resampling mode, 'best', 'fast' or 'preview' (see RESIZE_QUALITY)
+        memory_budget_mb: Optional per-item decode budget (see load_screenshot())
+
+    Yields:
+        (name, encoded bytes, metadata) per item and device, in input order.
+        On failure the bytes are None and metadata['status'] is 'error'.
+    """
+    device_types = [device_type] if isinstance(device_type, str) else list(device_type)
+    invalid = [d for d in device_types if d not in DEVICES]
+    if invalid:
+        raise ValueError(f"Device type '{', '.join(invalid)}' not supported. Choose from: {', '.join(DEVICES.keys())}")
+    for device in device_types:
+        resolve_output_format(device, output_format)
+
+    if workers <= 1:
+        for name, source, *overrides in items:
+            yield from _render_stream_item(name, source, device_types, auto_trim, output_format, quality, *(overrides or [None]), memory_budget_mb)
+        return
+
+    # Pillow releases the GIL while resizing and encoding, so threads overlap
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        in_flight = deque()
+        for name, source, *overrides in items:
+            in_flight.append(executor.submit(_render_stream_item, name, source, device_types, auto_trim, output_format, quality, *(overrides or [None]), memory_budget_mb))
+            if len(in_flight) >= 2 * workers:
+                yield from in_flight.popleft().result()
+        while in_flight:
+            yield from in_flight.popleft().result()
+
+def _render_screenshot_job(job):
+    """
+    Process-pool entry point: render one file and capture its console output
+    so the parent can print it in order.
+    """
+    buffer = io.StringIO()
+    with contextlib.redirect_stdout(buffer):
+        results = render_screenshot_file(*job)
+    return results, buffer.getvalue()
+
+class SharedImagePool:
+    """
+    Fixed set of multiprocessing.shared_memory slots for handing RGB(A) images
+    between pipeline processes without pickling their pixels.
+
+    RGB images are stored as RGBX, Pillow's own 4-byte pixel layout, because
+    Image.frombuffer can only map RGBX and RGBA (not packed RGB) without
+    copying. get() therefore returns RGB images in 'RGBX' mode.
+
+    Slot ids circulate through a queue, so put() blocks once every slot is in
+    use; that bounds how many images are in flight and therefore peak memory.
+    Images larger than a slot (or every image, with use_shared_memory=False)
+    are sent inline as pickled bytes instead.
+    """
+
+    def __init__(self, slots, slot_bytes, context, use_shared_memory=True):
+        self.slot_bytes = slot_bytes
+        self.use_shared_memory = use_shared_memory
+        self.blocks = []
+        self.free_slots = context.Queue()
+        if use_shared_memory:
+            from multiprocessing import shared_memory
+            for slot in range(slots):
+                self.blocks.append(shared_memory.SharedMemory(create=True, size=slot_bytes))
+                self.free_slots.put(slot)
+        self.names = [block.name for block in self.blocks]
+
+    def __getstate__(self):
+        # Worker processes re-attach to the blocks by name
+        state = self.__dict__.copy()
+        state['blocks'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+    def _block(self, slot):
+        if self.blocks is None:
+            from multiprocessing import shared_memory
+            self.blocks = [shared_memory.SharedMemory(name=name) for name in self.names]
+        return self.blocks[slot]
+
+    def put(self, image):
+        """
+        Copy an image into a free slot (waiting for one if necessary) and
+        return a small picklable handle.
+        """
+        rawmode = 'RGBX' if image.mode == 'RGB' else image.mode
+        size = image.width * image.height * len(rawmode)
+        if not self.use_shared_memory or size > self.slot_bytes:
+            return ('inline', image.mode, image.size, image.tobytes())
+        slot = self.free_slots.get()
+        self._block(slot).buf[:size] = image.tobytes('raw', rawmode)
+        return ('shared', rawmode, image.size, slot)
+
+    def get(self, handle):
+        """
+        Image for a handle. Shared slots are wrapped with Image.frombuffer, so
+        no pixels are copied; the image is read-only, only valid until the
+        handle is released, and 'RGBX' where an RGB image was put().
+        """
+        kind, mode, size, payload = handle
+        if kind == 'inline':
+            return Image.frombytes(mode, size, payload)
+        length = size[0] * size[1] * len(mode)
+        return Image.frombuffer(mode, size, self._block(payload).buf[:length], 'raw', mode, 0, 1)
+
+    def release(self, handle):
+        if handle[0] == 'shared':
+            self.free_slots.put(handle[3])
+
+    def close(self):
+        """
+        Free the shared memory (owner process only).
+        """
+        for block in self.blocks or []:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+def _pipeline_decode_worker(tasks, compose_queue, result_queue, source_pool):
+    """
+    Pipeline stage 1: decode, trim and convert screenshots into shared slots.
+    """
+    for idx, (input_path, targets, auto_trim, quality, overlay_overrides, memory_budget_mb, tile_size, scales) in iter(tasks.get, None):
+        buffer = io.StringIO()
+        file_timings = {}
+        try:
+            with contextlib.redirect_stdout(buffer), collect_timings(file_timings, memory=True):
+                screenshot, original_size = _load_screenshot_file(input_path, targets, auto_trim, quality, memory_budget_mb)
+            handle = source_pool.put(screenshot)
+            del screenshot
+        except Exception as e:
+            log = buffer.getvalue()
+            for device_type, output_path, _ in targets:
+                result = _mockup_result(os.path.basename(input_path), device_type, output_path)
+                result['status'] = 'error'
+                result['error'] = str(e)
+                result_queue.put((idx, result, log))
+                log = ''
+            continue
+        compose_queue.put((idx, input_path, targets, quality, overlay_overrides, tile_size, scales, handle, original_size, file_timings, buffer.getvalue()))
+
+def _pipeline_compose_worker(compose_queue, encode_queue, result_queue, source_pool, mockup_pool):
+    """
+    Pipeline stage 2: compose each device mockup from a shared source slot
+    into a shared mockup slot.
+    """
+    for item in iter(compose_queue.get, None):
+        idx, input_path, targets, quality, overlay_overrides, tile_size, scales, handle, original_size, file_timings, log = item
+        filename = os.path.basename(input_path)
+        screenshot = source_pool.get(handle)
+        resized_cache = {}
+        for device_type, output_path, output_format in targets:
+            result = _mockup_result(filename, device_type, output_path)
+            result['original_size'] = original_size
+            result['size'] = screenshot.size
+            result['trimmed'] = screenshot.size != original_size
+            result['file_timings'] = file_timings
+            buffer = io.StringIO()
+            try:
+                with contextlib.redirect_stdout(buffer), collect_timings(result['timings'], memory=True):
+                    mockup = render_device_mockup(screenshot, device_type, resized_cache, filename, quality, overlay_overrides)
+                if tile_size:
+                    result['tile'] = mockup_tile(mockup, tile_size)
+                mockup_handle = mockup_pool.put(mockup)
+                del mockup
+                encode_queue.put((idx, result, mockup_handle, output_path, output_format, scales, log + buffer.getvalue()))
+            except Exception as e:
+                result['status'] = 'error'
+                result['error'] = str(e)
+                _note_peak_rss(result)
+                result_queue.put((idx, result, log + buffer.getvalue()))
+            log = ''
+        # Drop every view of the slot before handing it back
+        del screenshot, resized_cache
+        source_pool.release(handle)
+
+def _pipeline_encode_worker(encode_queue, result_queue, mockup_pool):
+    """
+    Pipeline stage 3: encode mockups straight from their shared slots.
+    """
+    for idx, result, handle, output_path, output_format, scales, log in iter(encode_queue.get, None):
+        try:
+            with collect_timings(result['timings'], memory=True):
+                variants = encode_mockup_variants(mockup_pool.get(handle), output_path, output_format, scales)
+            result['variant_filenames'] = [os.path.basename(path) for path in variants]
+        except Exception as e:
+            result['status'] = 'error'
+            result['error'] = str(e)
+        finally:
+            mockup_pool.release(handle)
+        _note_peak_rss(result)
+        result_queue.put((idx, result, log))
+
+def stage_worker_counts(workers, stage_workers=None):
+    """
+    Split a worker budget across the decode (1/4), compose (1/2) and encode
+    (rest) pipeline stages, at least one each. Explicit stage_workers entries
+    ({'decode': n, 'compose': n, 'encode': n}) win.
+    """
+    decode = max(1, workers // 4)
+    compose = max(1, workers // 2)
+    counts = {'decode': decode, 'compose': compose, 'encode': max(1, workers - decode - compose)}
+    counts.update({stage: max(1, int(n)) for stage, n in (stage_workers or {}).items() if stage in counts})
+    return counts
+
+def run_shared_memory_pipeline(jobs, workers=3, buffer_slots=None, use_shared_memory=True, stage_workers=None):
+    """
+    Render jobs with separate decode, compose and encode processes that hand
+    images to each other through shared-memory slots.
+
+    Args:
+        jobs: List of (idx, (input_path, targets, auto_trim, quality,
+              overlay_overrides, memory_budget_mb, tile_size, scales)) as built by
+              process_all_screenshots()
+        workers: Total processes, split across the stages by stage_worker_counts()
+        buffer_slots: Slots per pool (sources and mockups); peak shared
+                      memory is about 2 * buffer_slots * the largest mockup
+        use_shared_memory: False pickles pixels through the queues instead
+                           (for benchmarking)
+        stage_workers: Optional per-stage process counts
+
+    Yields:
+        (idx, result dict, console log) per mockup, in completion order
+    """
+    counts = stage_worker_counts(workers, stage_workers)
+    decode_workers, compose_workers, encode_workers = counts['decode'], counts['compose'], counts['encode']
+    if buffer_slots is None:
+        buffer_slots = compose_workers + encode_workers + 1
+
+    # Slots are sized for the largest frame; bigger sources fall back to pickling
+    device_types = {target[0] for _, job in jobs for target in job[1]}
+    slot_bytes = max(get_device_frame(d)[0].width * get_device_frame(d)[0].height * 4 for d in device_types)
+    total = sum(len(job[1]) for _, job in jobs)
+
+    import multiprocessing
+    context = multiprocessing.get_context()
+    source_pool = SharedImagePool(buffer_slots, slot_bytes, context, use_shared_memory)
+    mockup_pool = SharedImagePool(buffer_slots, slot_bytes, context, use_shared_memory)
+    tasks, compose_queue, encode_queue, result_queue = (context.Queue() for _ in range(4))
+    processes = (
+        [context.Process(target=_pipeline_decode_worker, args=(tasks, compose_queue, result_queue, source_pool))
+         for _ in range(decode_workers)]
+        + [context.Process(target=_pipeline_compose_worker, args=(compose_queue, encode_queue, result_queue, source_pool, mockup_pool))
+           for _ in range(compose_workers)]
+        + [context.Process(target=_pipeline_encode_worker, args=(encode_queue, result_queue, mockup_pool))
+           for _ in range(encode_workers)]
+    )
+
+    try:
+        for process in processes:
+            process.start()
+        for job in jobs:
+            tasks.put(job)
+        for _ in range(decode_workers):
+            tasks.put(None)
+
+        received = 0
+        while received < total:
+            try:
+                item = result_queue.get(timeout=1)
+            except queue.Empty:
+                if any(p.exitcode not in (None, 0) for p in processes):
+                    raise RuntimeError("A pipeline worker process died unexpectedly")
+                continue
+            received += 1
+            yield item
+
+        for stage_queue, count in ((compose_queue, compose_workers), (encode_queue, encode_workers)):
+            for _ in range(count):
+                stage_queue.put(None)
+        for process in processes:
+            process.join()
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        source_pool.close()
+        mockup_pool.close()
+
+class _ThreadOutput:
+    """
+    sys.stdout stand-in that sends each pipeline thread's prints to its own
+    buffer (redirect_stdout is process-wide, so it can't be used per thread).
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+
+    def write(self, text):
+        buffer = getattr(self.local, 'buffer', None)
+        return (buffer or self.stream).write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    @contextlib.contextmanager
+    def capture(self):
+        buffer = io.StringIO()
+        self.local.buffer = buffer
+        try:
+            yield buffer
+        finally:
+            self.local.buffer = None
+
+def run_staged_pipeline(jobs, workers=3, stage_workers=None, queue_size=None, stats=None):
+    """
+    Render jobs with three thread pools joined by bounded queues, so disk
+    reads, CPU work and encoding/writes overlap:
+        decode: read and decode each screenshot
+        compose: trim, resize, composite and overlay each device mockup
+        encode: encode each mockup and write it to disk
+    Pillow releases the GIL while decoding, resizing and encoding, so threads
+    run those steps in parallel.
+
+    Args:
+        jobs: List of (idx, (input_path, targets, auto_trim, quality,
+              overlay_overrides, memory_budget_mb, tile_size, scales)) as built by
+              process_all_screenshots()
+        workers: Thread budget, split across the stages by stage_worker_counts()
+        stage_workers: Optional per-stage thread counts
+        queue_size: Capacity of each inter-stage queue (default: 2 per
+                    consumer thread); bounds how many images are in memory
+        stats: Optional dict, filled per stage with 'workers', 'items',
+               'busy_seconds' and 'idle_seconds' (time spent waiting for input)
+
+    Yields:
+        (idx, result dict, console log) per mockup, in completion order
+    """
+    counts = stage_worker_counts(workers, stage_workers)
+    if stats is None:
+        stats = {}
+    for stage, count in counts.items():
+        stats[stage] = {'workers': count, 'items': 0, 'busy_seconds': 0.0, 'idle_seconds': 0.0}
+    stats_lock = threading.Lock()
+
+    task_queue = queue.Queue()
+    compose_queue = queue.Queue(maxsize=queue_size or 2 * counts['compose'])
+    encode_queue = queue.Queue(maxsize=queue_size or 2 * counts['encode'])
+    result_queue = queue.Queue()
+    output = _ThreadOutput(sys.stdout)
+    remaining = dict(counts)
+
+    def record(stage, idle, busy):
+        with stats_lock:
+            stage_stats = stats[stage]
+            stage_stats['items'] += 1
+            stage_stats['idle_seconds'] += idle
+            stage_stats['busy_seconds'] += busy
+
+    def finish(stage, next_queue, next_stage):
+        # The last thread of a stage tells every thread of the next one to stop
+        with stats_lock:
+            remaining[stage] -= 1
+            last = remaining[stage] == 0
+        if last and next_queue is not None:
+            for _ in range(counts[next_stage]):
+                next_queue.put(None)
+
+    def fail(idx, input_path, targets, error, log):
+        for device_type, output_path, _ in targets:
+            result = _mockup_result(os.path.basename(input_path), device_type, output_path)
+            result['status'] = 'error'
+            result['error'] = str(error)
+            result_queue.put((idx, result, log))
+            log = ''
+
+    def decode_worker():
+        while True:
+            waited = time.perf_counter()
+            job = task_queue.get()
+            started = time.perf_counter()
+            if job is None:
+                break
+            idx, (input_path, targets, auto_trim, quality, overlay_overrides, memory_budget_mb, tile_size, scales) = job
+            file_timings = {}
+            original_size = None  # set once the screenshot is prepared
+            with output.capture() as log:
+                try:
+                    with collect_timings(file_timings):
+                        device_types = [target[0] for target in targets]
+                        with timed_stage('open'):
+                            screenshot = open_screenshot(input_path, device_types, quality)
+                        # Large sources are trimmed and reduced while decoding
+                        if _use_large_image_mode(screenshot, auto_trim, memory_budget_mb):
+                            screenshot, original_size = _load_large_screenshot(screenshot, device_types, auto_trim, memory_budget_mb)
+                        else:
+                            with timed_stage('open'):
+                                screenshot.load()
+                except Exception as e:
+                    fail(idx, input_path, targets, e, log.getvalue())
+                    continue
+            record('decode', started - waited, time.perf_counter() - started)
+            compose_queue.put((idx, input_path, targets, auto_trim, quality, overlay_overrides, tile_size, scales, file_timings, screenshot, original_size, log.getvalue()))
+        finish('decode', compose_queue, 'compose')
+
+    def compose_worker():
+        while True:
+            waited = time.perf_counter()
+            item = compose_queue.get()
+            started = time.perf_counter()
+            if item is None:
+                break
+            idx, input_path, targets, auto_trim, quality, overlay_overrides, tile_size, scales, file_timings, screenshot, original_size, decode_log = item
+            filename = os.path.basename(input_path)
+            with output.capture() as log:
+                log.write(decode_log)
+                try:
+                    if original_size is None:
+                        with collect_timings(file_timings):
+                            screenshot, original_size = prepare_screenshot(screenshot, auto_trim)
+                    _print_prepared(original_size, screenshot.size)
+                except Exception as e:
+                    fail(idx, input_path, targets, e, log.getvalue())
+                    continue
+                resized_cache = {}
+                for device_type, output_path, output_format in targets:
+                    result = _mockup_result(filename, device_type, output_path)
+                    result['original_size'] = original_size
+                    result['size'] = screenshot.size
+                    result['trimmed'] = screenshot.size != original_size
+                    result['file_timings'] = file_timings
+                    try:
+                        with collect_timings(result['timings']):
+                            mockup = render_device_mockup(screenshot, device_type, resized_cache, filename, quality, overlay_overrides)
+                        if tile_size:
+                            result['tile'] = mockup_tile(mockup, tile_size)
+                    except Exception as e:
+                        result['status'] = 'error'
+                        result['error'] = str(e)
+                        result_queue.put((idx, result, log.getvalue()))
+                    else:
+                        encode_queue.put((idx, result, mockup, output_path, output_format, scales, log.getvalue()))
+                    log.seek(0)
+                    log.truncate()
+            record('compose', started - waited, time.perf_counter() - started)
+        finish('compose', encode_queue, 'encode')
+
+    def encode_worker():
+        while True:
+            waited = time.perf_counter()
+            item = encode_queue.get()
+            started = time.perf_counter()
+            if item is None:
+                break
+            idx, result, mockup, output_path, output_format, scales, log = item
+            try:
+                with collect_timings(result['timings']):
+                    variants = encode_mockup_variants(mockup, output_path, output_format, scales)
+                result['variant_filenames'] = [os.path.basename(path) for path in variants]
+            except Exception as e:
+                result['status'] = 'error'
+                result['error'] = str(e)
+            record('encode', started - waited, time.perf_counter() - started)
+            result_queue.put((idx, result, log))
+        finish('encode', None, None)
+
+    threads = (
+        [threading.Thread(target=decode_worker, daemon=True) for _ in range(counts['decode'])]
+        + [threading.Thread(target=compose_worker, daemon=True) for _ in range(counts['compose'])]
+        + [threading.Thread(target=encode_worker, daemon=True) for _ in range(counts['encode'])]
+    )
+    for job in jobs:
+        task_queue.put(job)
+    for _ in range(counts['decode']):
+        task_queue.put(None)
+
+    total = sum(len(job[1]) for _, job in jobs)
+    original_stdout = sys.stdout
+    sys.stdout = output
+    try:
+        for thread in threads:
+            thread.start()
+        for _ in range(total):
+            yield result_queue.get()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.stdout = original_stdout
+
+def print_stage_stats(stats):
+    """
+    Print per-stage timing from run_staged_pipeline(stats=...).
+    """
+    for stage, stage_stats in stats.items():
+        print(f"   ⏱️  {stage:<8} {stage_stats['workers']} thread(s) | "
+              f"{stage_stats['items']} item(s) | "
+              f"busy {stage_stats['busy_seconds']:.2f}s | "
+              f"waiting {stage_stats['idle_seconds']:.2f}s")
+
+def _in_job_order(jobs, results):
+    """
+    Regroup an unordered stream of (idx, result, log) per mockup into
+    (idx, file_results, log) per file, yielded in job order as soon as each
+    file is complete.
+    """
+    expected = {idx: job[1] for idx, job in jobs}
+    pending = {idx: [] for idx, _ in jobs}
+    logs = {idx: '' for idx, _ in jobs}
+    position = 0
+    for idx, result, log in results:
+        pending[idx].append(result)
+        logs[idx] += log
+        while position < len(jobs) and len(pending[jobs[position][0]]) == len(expected[jobs[position][0]]):
+            done = jobs[position][0]
+            device_order = [target[0] for target in expected[done]]
+            file_results = sorted(pending.pop(done), key=lambda r: device_order.index(r['device_type']))
+            yield done, file_results, logs.pop(done)
+            position += 1
+
+def _matches_any(rel_path, patterns):
+    name = posixpath.basename(rel_path)
+    return any(fnmatch.fnmatch(rel_path, pattern) or fnmatch.fnmatch(name, pattern) for pattern in patterns)
+
+def iter_screenshots(input_folder, recursive=False, include=None, exclude=None, skip_folders=()):
+    """
+    Lazily yield screenshot paths under input_folder, relative to it and
+    '/'-separated, using os.scandir.
+
+    Folders are walked depth-first as they are reached, so callers can start
+    on the first screenshots before a large tree is fully listed. Hidden
+    folders and skip_folders (e.g. an output folder inside input_folder) are
+    skipped, and each folder is visited once, so symlink loops end.
+    include/exclude globs match either the relative path or the bare filename.
+    """
+    def folder_key(stat):
+        return stat.st_dev, stat.st_ino
+
+    skipped = set()
+    for folder in skip_folders:
+        try:
+            skipped.add(folder_key(os.stat(folder)))
+        except OSError:
+            pass  # Not created yet, so nothing to skip
+    visited = {folder_key(os.stat(input_folder))}
+    pending = ['']
+    while pending:
+        rel_dir = pending.pop()
+        subdirs = []
+        try:
+            with os.scandir(os.path.join(input_folder, rel_dir)) as entries:
+                for entry in entries:
+                    rel_path = posixpath.join(rel_dir, entry.name) if rel_dir else entry.name
+                    if entry.is_dir():
+                        if recursive and not entry.name.startswith('.'):
+                            try:
+                                key = folder_key(entry.stat())
+                            except OSError:
+                                continue  # Broken link
+                            if key not in visited and key not in skipped:
+                                visited.add(key)
+                                subdirs.append(rel_path)
+                        continue
+                    if not entry.name.lower().endswith(SUPPORTED_FORMATS):
+                        continue
+                    if include and not _matches_any(rel_path, include):
+                        continue
+                    if exclude and _matches_any(rel_path, exclude):
+                        continue
+                    yield rel_path
+        except OSError as e:
+            if not rel_dir:
+                raise
+            print(f"   ⚠️  Cannot read folder '{rel_dir}': {e}")
+        # Visit subfolders in listing order
+        pending.extend(reversed(subdirs))
+
+def plan_mockups(input_path, output_folder, device_formats, manifest_entries, skip_existing=True, auto_trim=True, quality='best', overlay_overrides=None, output_subdir='', scales=()):
+    """
+    Decide which device mockups of one screenshot need rendering.
+
+    Args:
+        device_formats: {device_type: output format} to render
+        manifest_entries: The 'entries' of the output folder's manifest
+        output_subdir: '/'-separated folder under output_folder mirroring the
+                       screenshot's folder under the input root ('' for none)
+        scales: Extra output sizes from normalize_scales(). They do not make
+                a mockup stale: an up-to-date mockup missing some of them
+                is skipped with 'missing_variants' (see
+                complete_skipped_variants())
+
+    Returns:
+        (targets, skipped, pending entries): render_screenshot_file() targets,
+        'skipped' result dicts for up-to-date mockups, and the manifest
+        entries to record once the targets render, keyed by output path
+        relative to output_folder
+    """
+    filename = os.path.basename(input_path)
+    name_without_ext = os.path.splitext(filename)[0]
+    source_name = posixpath.join(output_subdir, filename) if output_subdir else filename
+
+    def output_key(device, output_format):
+        output_filename = mockup_filename(name_without_ext, device, output_format)
+        return posixpath.join(output_subdir, output_filename) if output_subdir else output_filename
+
+    # Any earlier entry for this source lets unchanged files skip re-hashing
+    previous = None
+    for device, output_format in device_formats.items():
+        previous = manifest_entries.get(output_key(device, output_format))
+        if previous:
+            break
+
+    try:
+        source_size, source_mtime_ns, source_hash = source_fingerprint(input_path, previous)
+    except OSError:
+        source_hash = None  # Unreadable source: render it and report the error
+
+    targets = []
+    skipped = []
+    pending_entries = {}
+    for device, output_format in device_formats.items():
+        output_filename = output_key(device, output_format)
+        output_path = os.path.join(output_folder, output_filename)
+
+        if source_hash is not None:
+            fingerprint = build_fingerprint(source_hash, device, auto_trim, quality, output_format, overlay_overrides)
+            entry = manifest_entries.get(output_filename, {})
+            if skip_existing and entry.get('fingerprint') == fingerprint and os.path.exists(output_path):
+                result = {'filename': source_name, 'device_type': device, 'output_filename': output_filename, 'status': 'skipped'}
+                # Variants are only current if made from this render
+                recorded = set(entry.get('variants', ()))
+                missing = [scale for scale in scales if variant_key(scale) not in recorded or not os.path.exists(variant_path(output_path, scale))]
+                if missing:
+                    result['missing_variants'] = missing
+                skipped.append(result)
+                continue
+            pending_entries[output_filename] = {
+                'source': source_name,
+                'source_size': source_size,
+                'source_mtime_ns': source_mtime_ns,
+                'source_hash': source_hash,
+                'device_type': device,
+                'fingerprint': fingerprint
+            }
+            if scales:
+                pending_entries[output_filename]['variants'] = sorted(variant_key(scale) for scale in scales)
+        targets.append((device, output_path, output_format))
+    return targets, skipped, pending_entries
+
+def complete_skipped_variants(result, output_folder, output_format, manifest_entries):
+    """
+    Save the variants plan_mockups() found missing next to an up-to-date
+    mockup (see complete_mockup_variants()) and list them in its manifest
+    entry. A mockup that cannot be read turns the result into an error and
+    drops its entry, so the next run renders it again.
+
+    Returns:
+        True if the manifest changed
+    """
+    missing = result.pop('missing_variants', None)
+    if not missing:
+        return False
+    key = result['output_filename']
+    try:
+        paths = complete_mockup_variants(os.path.join(output_folder, key), output_format, missing)
+    except Exception as e:
+        result.update(status='error', error=str(e))
+        manifest_entries.pop(key, None)
+        return True
+    entry = manifest_entries[key]
+    entry['variants'] = sorted(set(entry.get('variants', ())) | {variant_key(scale) for scale in missing})
+    result['variant_filenames'] = [posixpath.join(posixpath.dirname(key), os.path.basename(path)) for path in paths]
+    print(f"   Added {', '.join(posixpath.basename(name) for name in result['variant_filenames'])} to up-to-date mockup: {key}")
+    return True
+
+def _percentile(values, percent):
+    """
+    Linearly interpolated percentile of a non-empty list.
+    """
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * percent / 100
+    low = math.floor(rank)
+    high = math.ceil(rank)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+def _summarize_seconds(values):
+    """
+    count/total/p50/p95/max of a list of durations in seconds.
+    """
+    if not values:
+        return {'count': 0, 'total': 0.0, 'p50': None, 'p95': None, 'max': None}
+    return {
+        'count': len(values),
+        'total': sum(values),
+        'p50': _percentile(values, 50),
+        'p95': _percentile(values, 95),
+        'max': max(values)
+    }
+
+def build_run_report(results, wall_seconds=None, stage_stats=None):
+    """
+    Aggregate the instrumentation in render results into a run report.
+
+    Args:
+        results: Per-mockup result dicts from process_all_screenshots();
+                 skipped mockups are ignored
+        wall_seconds: Optional wall time of the whole run
+        stage_stats: Optional per-stage stats from run_staged_pipeline()
+
+    Returns:
+        Dict with 'stages' (wall and CPU p50/p95/max and the highest peak RSS
+        per TIMED_STAGES entry; 'open' and 'trim' count once per screenshot),
+        'devices' (mockup count, errors and per-mockup wall time summary per
+        device, excluding the shared 'open' and 'trim'), 'peak_rss_mb' and
+        'rows', one flat dict per mockup (also the CSV layout)
+    """
+    rendered = [r for r in results if r['status'] != 'skipped']
+    seen_files = set()
+    stage_wall = {stage: [] for stage in TIMED_STAGES}
+    stage_cpu = {stage: [] for stage in TIMED_STAGES}
+    stage_peaks = {stage: [] for stage in TIMED_STAGES}
+    devices = {}
+    rows = []
+
+    for result in rendered:
+        file_timings = result.get('file_timings') or {}
+        timings = result.get('timings') or {}
+        # One screenshot's open/trim are shared by all of its devices
+        if result['filename'] not in seen_files:
+            seen_files.add(result['filename'])
+            for stage, entry in file_timings.items():
+                stage_wall[stage].append(entry['wall'])
+                stage_cpu[stage].append(entry['cpu'])
+                if 'peak_rss_mb' in entry:
+                    stage_peaks[stage].append(entry['peak_rss_mb'])
+        for stage, entry in timings.items():
+            stage_wall[stage].append(entry['wall'])
+            stage_cpu[stage].append(entry['cpu'])
+            if 'peak_rss_mb' in entry:
+                stage_peaks[stage].append(entry['peak_rss_mb'])
+
+        device = devices.setdefault(result['device_type'], {'mockups': 0, 'errors': 0, 'wall': []})
+        device['mockups'] += 1
+        device['errors'] += result['status'] == 'error'
+        if timings:
+            device['wall'].append(sum(entry['wall'] for entry in timings.values()))
+
+        row = {
+            'filename': result['filename'],
+            'device_type': result['device_type'],
+            'output_filename': result['output_filename'],
+            'status': result['status']
+        }
+        for stage in TIMED_STAGES:
+            entry = (file_timings if stage in FILE_STAGES else timings).get(stage)
+            row[f'{stage}_ms'] = round(entry['wall'] * 1000, 3) if entry else None
+        row['cpu_ms'] = round(sum(entry['cpu'] for entry in timings.values()) * 1000, 3)
+        row['peak_rss_mb'] = result.get('peak_rss_mb')
+        row['error'] = result.get('error')
+        rows.append(row)
+
+    peaks = [r['peak_rss_mb'] for r in rows if r['peak_rss_mb'] is not None]
+    report = {
+        'generator_version': GENERATOR_VERSION,
+        'wall_seconds': wall_seconds,
+        'mockups': len(rendered),
+        'errors': sum(1 for r in rendered if r['status'] == 'error'),
+        'peak_rss_mb': max(peaks) if peaks else None,
+        'stages': {
+            stage: {
+                'wall': _summarize_seconds(stage_wall[stage]),
+                'cpu': _summarize_seconds(stage_cpu[stage]),
+                'peak_rss_mb': max(stage_peaks[stage]) if stage_peaks[stage] else None
+            }
+            for stage in TIMED_STAGES
+        },
+        'devices': {
+            device_type: {'mockups': d['mockups'], 'errors': d['errors'], 'wall': _summarize_seconds(d['wall'])}
+            for device_type, d in devices.items()
+        },
+        'rows': rows
+    }
+    if stage_stats:
+        report['pipeline_stages'] = stage_stats
+    return report
+
+def write_run_report(report, path):
+    """
+    Save a build_run_report() dict: '.csv' paths get one row per mockup,
+    anything else the full report as JSON.
+    """
+    if path.lower().endswith('.csv'):
+        import csv
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            fieldnames = ['filename', 'device_type', 'output_filename', 'status']
+            fieldnames += [f'{stage}_ms' for stage in TIMED_STAGES] + ['cpu_ms', 'peak_rss_mb', 'error']
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(report['rows'])
+    else:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+def build_dedupe_groups(sources, duplicates):
+    """
+    Duplicate groups of a dedupe run, in input order.
+
+    Args:
+        sources: {job index: screenshot path relative to the input folder}
+        duplicates: {job index: (representative job index, distance, job)}
+
+    Returns:
+        List of {'representative': path, 'duplicates': [{'filename': path,
+        'distance': differing hash bits}]}
+    """
+    groups = {}
+    for idx, (rep_idx, distance, _) in sorted(duplicates.items()):
+        group = groups.setdefault(rep_idx, {'representative': sources[rep_idx], 'duplicates': []})
+        group['duplicates'].append({'filename': sources[idx], 'distance': distance})
+    return [groups[rep_idx] for rep_idx in sorted(groups)]
+
+def write_dedupe_report(groups, path, threshold, screenshot_count):
+    """
+    Save build_dedupe_groups() as JSON, with the settings and totals.
+    """
+    report = {
+        'generator_version': GENERATOR_VERSION,
+        'hash_size': DEDUPE_HASH_SIZE,
+        'threshold': threshold,
+        'screenshots': screenshot_count,
+        'unique': screenshot_count - sum(len(group['duplicates']) for group in groups),
+        'groups': groups
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+@contextlib.contextmanager
+def profile_run(path):
+    """
+    Profile a block into path: a pyinstrument HTML page for '.html' paths
+    (needs pyinstrument), otherwise cProfile stats for pstats/snakeviz.
+    Only this thread is profiled, so use workers=1 without a pipeline.
+    """
+    if path.lower().endswith('.html'):
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            raise RuntimeError("HTML profiles need pyinstrument (pip install pyinstrument)") from None
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(profiler.output_html())
+    else:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(path)
+
+# Contact sheets: mockup thumbnails in a grid on fixed-size pages; the default
+# page is A4 portrait at 300 dpi
+CONTACT_SHEET_PAGE_SIZE = (2480, 3508)
+CONTACT_SHEET_DPI = 300
+CONTACT_SHEET_GRID = (4, 3)  # columns, rows
+CONTACT_SHEET_SPACING = 40
+CONTACT_SHEET_MARGIN = 120
+CONTACT_SHEET_LABEL_SIZE = 32
+CONTACT_SHEET_BACKGROUND = (255, 255, 255)
+
+def mockup_tile(mockup, tile_size):
+    """
+    Downscaled copy of a mockup that fits inside tile_size (aspect ratio
+    kept), for ContactSheet. Smaller mockups are returned unchanged.
+    """
+    scale = min(tile_size[0] / mockup.width, tile_size[1] / mockup.height)
+    if scale >= 1:
+        return mockup
+    size = (max(1, round(mockup.width * scale)), max(1, round(mockup.height * scale)))
+    return mockup.resize(size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+
+class ContactSheet:
+    """
+    Grid of mockup thumbnails on fixed-size pages, e.g. a campaign overview
+    for a client report.
+
+    add() pastes each tile as soon as it arrives and saves a page the moment
+    it is full, so only one page is held in memory however many mockups are
+    added; a new page starts automatically. A '.pdf' path collects every
+    page in one file. For image formats a single page is saved as path, and
+    several as name-1.png, name-2.png, ...
+    """
+
+    def __init__(self, path, page_size=CONTACT_SHEET_PAGE_SIZE, grid=CONTACT_SHEET_GRID, spacing=CONTACT_SHEET_SPACING, margin=CONTACT_SHEET_MARGIN, labels=True, label_size=CONTACT_SHEET_LABEL_SIZE, title=None, background=CONTACT_SHEET_BACKGROUND, dpi=CONTACT_SHEET_DPI):
+        """
+        Args:
+            path: Output path; the extension picks the format
+            page_size: (width, height) of a page in pixels
+            grid: (columns, rows) of tiles per page
+            spacing: Pixels between cells
+            margin: Pixels around the grid
+            labels: Print each tile's label under it
+            label_size: Label font size in pixels
+            title: Optional heading printed on every page, with the page number
+            background: RGB page colour
+            dpi: Resolution recorded in the saved pages
+        """
+        self.path = path
+        self.page_size = tuple(page_size)
+        self.columns, self.rows = grid
+        self.spacing = spacing
+        self.margin = margin
+        self.label_font = load_font(label_size) if labels else None
+        self.label_height = round(label_size * 1.6) if labels else 0
+        self.title = title
+        self.title_font = load_font(round(label_size * 1.5), bold=True) if title else None
+        self.header_height = round(label_size * 1.5) + spacing if title else 0
+        self.background = background
+        self.dpi = dpi
+        self.pages = []  # paths of the saved pages (the .pdf once per page)
+        self.tiles = 0
+        self._page = None
+        self._slot = 0
+
+        cell_width = (self.page_size[0] - 2 * margin - (self.columns - 1) * spacing) // self.columns
+        cell_height = (self.page_size[1] - 2 * margin - self.header_height - (self.rows - 1) * spacing) // self.rows
+        if cell_width < 1 or cell_height - self.label_height < 1:
+            raise ValueError(f"A {self.columns}x{self.rows} grid does not fit on a {self.page_size[0]}x{self.page_size[1]} page")
+        self.cell_size = (cell_width, cell_height)
+        # Largest mockup thumbnail a cell holds; workers downscale to this
+        self.tile_size = (cell_width, cell_height - self.label_height)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _fit_label(self, text):
+        # Shorten with an ellipsis to the cell width
+        if _text_width(self.label_font, text) <= self.cell_size[0]:
+            return text
+        while text and _text_width(self.label_font, text + '…') > self.cell_size[0]:
+            text = text[:-1]
+        return text + '…'
+
+    def _new_page(self):
+        self._page = Image.new('RGB', self.page_size, self.background)
+        if self.title:
+            from PIL import ImageDraw
+            draw = ImageDraw.Draw(self._page)
+            page_label = f"Page {len(self.pages) + 1}"
+            draw.text((self.margin, self.margin), self.title, font=self.title_font, fill=(30, 30, 30))
+            draw.text((self.page_size[0] - self.margin - _text_width(self.title_font, page_label), self.margin), page_label, font=self.title_font, fill=(120, 120, 120))
+
+    def _save_page(self):
+        if self.path.lower().endswith('.pdf'):
+            self._page.save(self.path, 'PDF', resolution=self.dpi, append=bool(self.pages))
+            page_path = self.path
+        else:
+            stem, ext = os.path.splitext(self.path)
+            page_path = f"{stem}-{len(self.pages) + 1}{ext}"
+            self._page.save(page_path, dpi=(self.dpi, self.dpi))
+        self.pages.append(page_path)
+        self._page = None
+        self._slot = 0
+
+    def add(self, mockup, label=None):
+        """
+        Place a mockup in the next cell.
+
+        Args:
+            mockup: PIL Image (ideally already a mockup_tile() of tile_size)
+                    or the path of a saved mockup
+            label: Optional caption, shortened to the cell width
+        """
+        if isinstance(mockup, Image.Image):
+            tile = mockup_tile(mockup, self.tile_size)
+        else:
+            with Image.open(mockup) as image:
+                tile = mockup_tile(image, self.tile_size)
+                tile.load()
+        if tile.mode not in ('RGB', 'RGBA'):
+            tile = tile.convert('RGBA')
+
+        if self._page is None:
+            self._new_page()
+        column, row = self._slot % self.columns, self._slot // self.columns
+        x = self.margin + column * (self.cell_size[0] + self.spacing)
+        y = self.margin + self.header_height + row * (self.cell_size[1] + self.spacing)
+        # Centred in the cell, above the label
+        position = (x + (self.tile_size[0] - tile.width) // 2, y + (self.tile_size[1] - tile.height) // 2)
+        self._page.paste(tile, position, tile if tile.mode == 'RGBA' else None)
+        if label and self.label_font:
+            from PIL import ImageDraw
+            text = self._fit_label(label)
+            text_x = x + (self.cell_size[0] - _text_width(self.label_font, text)) // 2
+            ImageDraw.Draw(self._page).text((text_x, y + self.tile_size[1] + self.label_height // 4), text, font=self.label_font, fill=(90, 90, 90))
+
+        self.tiles += 1
+        self._slot += 1
+        if self._slot == self.columns * self.rows:
+            self._save_page()
+
+    def close(self):
+        """
+        Save the last, partly filled page; returns the saved files.
+        """
+        if self._page is not None:
+            self._save_page()
+        if len(self.pages) == 1 and self.pages[0] != self.path:
+            # One page: no page number in the name
+            os.replace(self.pages[0], self.path)
+            self.pages[0] = self.path
+        return sorted(set(self.pages), key=self.pages.index)
+
+def process_all_screenshots(input_folder='./screenshots', output_folder='./mockups', device_type='iphone14', skip_existing=True, auto_trim=True, workers=1, quality='best', output_format=None, overlay_overrides=None, pipeline=None, stage_workers=None, report_path=None, profile_path=None, include=None, exclude=None, progress=None, recursive=False, memory_budget_mb=None, dedupe=None, dedupe_report=None, contact_sheet=None, scales=None):
+    """
+    Process all screenshots in the input folder and create mockups
+
+    Args:
+        input_folder: Path to folder containing screenshots
+        output_folder: Path to save generated mockups
+        device_type: Device frame to use (e.g., 'iphone14', 'macbook14'), or a
+                     list of devices to render every screenshot into
+        skip_existing: Skip mockups that are up to date. A mockup is rebuilt when
+                       its source bytes, device config, trim settings or the
+                       generator version changed (tracked in MANIFEST_FILENAME)
+        auto_trim: Automatically remove white/light borders from screenshots
+        workers: Number of worker processes (1 renders in this process)
+        quality: Resampling mode: 'best' (full LANCZOS), 'fast' (JPEG draft
+                 decoding + integer reduce before LANCZOS) or 'preview' (BILINEAR)
+        output_format: Key of OUTPUT_FORMATS for every device; None uses each
+                       device's 'output_format' (default PNG)
+        overlay_overrides: Optional {screenshot filename: {setting: value}} of
+                           per-ad overlay_settings, e.g. a different cta_text
+        pipeline: None renders whole files per worker; 'shared_memory' splits
+                  decode, compose and encode into separate processes that pass
+                  images through shared memory (see run_shared_memory_pipeline);
+                  'staged' runs those stages as thread pools joined by bounded
+                  queues and prints per-stage timings (see run_staged_pipeline)
+        stage_workers: Optional {'decode': n, 'compose': n, 'encode': n} for
+                       the pipelines; otherwise workers is split between stages
+        report_path: Optional .json or .csv path for a timing report of the
+                     run (see build_run_report)
+        profile_path: Optional profiler output around rendering (see profile_run)
+        include: Optional glob patterns, matched against the filename or the
+                 path relative to input_folder; only matching screenshots
+                 are processed (e.g. ['*_story*.png', 'acme/*'])
+        exclude: Optional glob patterns to leave out
+        progress: Optional callback(result, index, total) called for every
+                  mockup result (skipped ones included) as it is reported;
+                  total is None for recursive runs
+        recursive: Also process subfolders, mirroring them under output_folder.
+                   Folders are scanned while rendering runs, so large trees
+                   start producing mockups right away
+        memory_budget_mb: Optional decode budget per worker, in MB. Screenshots
+                          whose normal decode would not fit use large-image
+                          mode (see load_screenshot()); those that still do
+                          not fit fail instead of exhausting memory
+        dedupe: Optional Hamming threshold in bits (e.g. DEDUPE_THRESHOLD)
+                that turns on near-duplicate detection: screenshots whose
+                dhash() is within it of an earlier one (with the same overlay
+                overrides) are not rendered; they get hardlinks, or copies,
+                of that screenshot's mockups. 0 still catches re-encoded
+                exact copies
+        dedupe_report: Optional .json path listing the duplicate groups
+        contact_sheet: Optional path (.pdf, .png, ...) or ContactSheet that
+                       every mockup is tiled onto as it is reported. Workers
+                       send back only thumbnails; up-to-date and linked
+                       mockups are read back from disk. A ContactSheet passed
+                       in is left open, so several runs can share one
+        scales: Optional output sizes besides the full-size mockup, e.g.
+                [1, 0.5, 'thumb'] (see normalize_scales()). Each mockup is
+                composed once and the smaller files are derived from it in
+                memory, named like name@0.5x.png and name_thumb.png
+
+    Returns:
+        List of per-mockup result dicts (see render_screenshot_file); skipped
+        mockups have status 'skipped', linked duplicates have a
+        'duplicate_of' key naming the screenshot that was rendered
+    """
+    device_types = [device_type] if isinstance(device_type, str) else list(device_type)
+
+    # Validate device types
+    invalid = [d for d in device_types if d not in DEVICES]
+    if invalid or not device_types:
+        print(f"❌ Invalid device type: '{', '.join(invalid)}'")
+        print(f"   Available devices: {', '.join(DEVICES.keys())}")
+        return []
+
+    if pipeline not in PIPELINES:
+        print(f"❌ Invalid pipeline: '{pipeline}'")
+        print(f"   Available pipelines: {', '.join(p for p in PIPELINES if p)}")
+        return []
+
+    if quality not in RESIZE_QUALITY:
+        print(f"❌ Invalid quality: '{quality}'")
+        print(f"   Available qualities: {', '.join(RESIZE_QUALITY.keys())}")
+        return []
+
+    try:
+        device_formats = {d: resolve_output_format(d, output_format) for d in device_types}
+    except ValueError:
+        print(f"❌ Invalid output format: '{output_format}'")
+        print(f"   Available formats: {', '.join(OUTPUT_FORMATS.keys())}")
+        return []
+
+    try:
+        scales = normalize_scales(scales)
+    except ValueError as e:
+        print(f"❌ Invalid output scale: {e}")
+        print("   Use factors between 0 and 1, or 'thumb'")
+        return []
+
+    # Create output folder if it doesn't exist
+    Path(output_folder).mkdir(parents=True, exist_ok=True)
+
+    # Supported image formats
+    supported_formats = SUPPORTED_FORMATS
+
+    # Find image files. A recursive scan stays lazy so rendering starts
+    # while the rest of the tree is still being listed.
+    screenshot_files = iter_screenshots(input_folder, recursive, include, exclude, skip_folders=[output_folder])
+    total = None
+    if not recursive:
+        screenshot_files = list(screenshot_files)
+        total = len(screenshot_files)
+        if not screenshot_files:
+            print(f"❌ No image files found in '{input_folder}'")
+            print(f"   Supported formats: {', '.join(supported_formats)}")
+            return []
+
+    workers = max(1, int(workers or 1))
+    if total and not pipeline:
+        workers = min(workers, total)
+    device_names = ', '.join(DEVICES[d]['name'] for d in device_types)
+    if total:
+        print(f"📱 Found {total} screenshot(s) to process...")
+    else:
+        print(f"📱 Scanning '{input_folder}' and its subfolders...")
+    print(f"🖥️  Device: {device_names}")
+    if auto_trim:
+        print("✂️  Auto-trim: ON (removing white borders)")
+    if skip_existing:
+        print("⏭️  Skipping screenshots with up-to-date mockups.")
+    if pipeline:
+        print(f"⚙️  Pipeline: {pipeline} ({workers} {'threads' if pipeline == 'staged' else 'processes'})")
+    elif workers > 1:
+        print(f"⚙️  Workers: {workers} processes")
+    if quality != 'best':
+        print(f"🏎️  Resize quality: {quality}")
+    if memory_budget_mb is not None:
+        print(f"🧠 Memory budget: {memory_budget_mb:g} MB per worker")
+    if dedupe is not None:
+        print(f"🧬 Dedupe: screenshots within {dedupe} bit(s) of each other render once")
+    if set(device_formats.values()) != {DEFAULT_OUTPUT_FORMAT}:
+        print(f"💾 Output format: {', '.join(sorted(set(device_formats.values())))}")
+    if scales:
+        print(f"📐 Output sizes: 1x, {', '.join(scale if scale == 'thumb' else f'{scale:g}x' for scale in scales)}")
+    print("-" * 50)
+
+    sheet = contact_sheet
+    if contact_sheet is not None and not isinstance(contact_sheet, ContactSheet):
+        sheet = ContactSheet(contact_sheet)
+    tile_size = sheet.tile_size if sheet else None
+
+    manifest = load_manifest(output_folder)
+    manifest_entries = manifest['entries']
+    pending_entries = {}
+
+    results = []
+    sources = {}  # job index -> path relative to input_folder
+    created_dirs = set()
+    outputs = {}  # (job index, device) -> output key of a rendered or up-to-date mockup
+    representatives = {}  # overlay overrides -> [(dedupe signature, job index)] of screenshots rendered
+    fingerprints = {}  # job index -> {device: fingerprint} with dedupe, to tell if links are current
+    duplicates = {}  # job index -> (representative job index, distance, job)
+    peaks = {}  # output key -> peak_rss_mb of a mockup rendered in this run
+    unlinked = {}  # job index -> duplicate whose mockups are not linked yet
+    sheet_tiles = {}  # job index -> [(device, tile or path)] waiting for earlier files
+    done = set()  # job indexes with all their results, waiting for earlier files
+    next_done = 1  # first job index without all its results
+    advancing = False
+
+    def label(idx):
+        return f"{idx}/{total}" if total else str(idx)
+
+    def report_skipped(idx, result):
+        if complete_skipped_variants(result, output_folder, device_formats[result['device_type']], manifest_entries):
+            checkpoint()
+        results.append(result)
+        if result['status'] == 'error':
+            print(f"❌ [{label(idx)}] Error processing {sources[idx]}: {result['error']}")
+            if progress:
+                progress(result, idx, total)
+            return
+        outputs[(idx, result['device_type'])] = result['output_filename']
+        print(f"   Skipping up-to-date mockup: {result['output_filename']}")
+        if sheet:
+            sheet_tiles.setdefault(idx, []).append((result['device_type'], sheet_source(result['output_filename'])))
+        if progress:
+            progress(result, idx, total)
+
+    def sheet_source(key):
+        # A mockup read back from disk: its thumbnail saves decoding the
+        # full-size file when it is at least as large as a tile
+        path = os.path.join(output_folder, key)
+        thumb = variant_path(path, 'thumb')
+        if 'thumb' in scales and os.path.exists(thumb):
+            with Image.open(thumb) as image:
+                if image.width >= tile_size[0] or image.height >= tile_size[1]:
+                    return thumb
+        return path
+
+    def finish(idx):
+        # File idx has all its results
+        done.add(idx)
+        advance()
+
+    def advance():
+        # Walk past every finished file in input order: its tiles go on the
+        # contact sheet, and a duplicate is linked once the files before it
+        # (so its representative) are finished. The sheet follows input
+        # order in every execution mode and only holds tiles of files
+        # still in flight.
+        nonlocal next_done, advancing
+        if advancing:
+            return  # finish() from link_duplicate(); the loop below moves on
+        advancing = True
+        try:
+            while True:
+                if next_done in unlinked:
+                    link_duplicate(next_done, *unlinked.pop(next_done))
+                if next_done not in done:
+                    break
+                done.discard(next_done)
+                if sheet:
+                    tiles = sorted(sheet_tiles.pop(next_done, []), key=lambda tile: device_types.index(tile[0]))
+                    for device, tile in tiles:
+                        sheet.add(tile, f"{sources[next_done]} · {device}")
+                next_done += 1
+        finally:
+            advancing = False
+
+    def plan_jobs():
+        # Report skipped mockups and yield render jobs, in discovery order
+        for idx, rel_path in enumerate(screenshot_files, 1):
+            sources[idx] = rel_path
+            rel_dir = posixpath.dirname(rel_path)
+            if rel_dir and rel_dir not in created_dirs:
+                Path(output_folder, rel_dir).mkdir(parents=True, exist_ok=True)
+                created_dirs.add(rel_dir)
+            input_path = os.path.join(input_folder, rel_path)
+            file_overrides = (overlay_overrides or {}).get(rel_path) or (overlay_overrides or {}).get(posixpath.basename(rel_path))
+            targets, skipped, entries = plan_mockups(
+                input_path, output_folder, device_formats, manifest_entries,
+                skip_existing, auto_trim, quality, file_overrides, rel_dir, scales
+            )
+            pending_entries.update(entries)
+            for result in skipped:
+                report_skipped(idx, result)
+
+            job = (input_path, targets, auto_trim, quality, file_overrides, memory_budget_mb, tile_size, scales)
+            if dedupe is not None:
+                # Up-to-date mockups (an unreadable one has lost its entry)
+                current = [manifest_entries[result['output_filename']] for result in skipped if result['output_filename'] in manifest_entries]
+                fingerprints[idx] = {entry['device_type']: entry['fingerprint'] for entry in [*entries.values(), *current]}
+                # Signatures recorded for the same source bytes save a decode
+                source_hashes = {entry['source_hash'] for entry in [*entries.values(), *current]}
+                previous = [*(manifest_entries.get(key) for key in entries), *current]
+                try:
+                    signature = source_signature(input_path, auto_trim, [e for e in previous if e and e.get('source_hash') in source_hashes])
+                except Exception:
+                    signature = None  # Unreadable source: render it alone and report the error
+                if signature is not None:
+                    for entry in entries.values():
+                        entry['source_dedupe'] = signature
+                    candidates = representatives.setdefault(json.dumps(file_overrides or {}, sort_keys=True), [])
+                    distances = ((signature_distance(signature, other), rep_idx) for other, rep_idx in candidates)
+                    match = min(((distance, rep_idx) for distance, rep_idx in distances if distance is not None), default=None)
+                    if match and match[0] <= dedupe:
+                        distance, rep_idx = match
+                        # Links made from the same representative render last time are up to date
+                        stale = []
+                        for target in targets:
+                            key = posixpath.join(rel_dir, os.path.basename(target[1]))
+                            entry = manifest_entries.get(key, {})
+                            if (skip_existing and entry.get('duplicate_of')
+                                    and entry.get('fingerprint') == fingerprints[rep_idx].get(target[0])
+                                    and entry.get('source_hash') == entries.get(key, {}).get('source_hash')
+                                    and all(os.path.exists(path) for path in [target[1], *(variant_path(target[1], scale) for scale in scales)])):
+                                report_skipped(idx, {'filename': rel_path, 'device_type': target[0], 'output_filename': key, 'status': 'skipped', 'duplicate_of': sources[rep_idx]})
+                            else:
+                                stale.append(target)
+                        duplicates[idx] = (rep_idx, distance, (input_path, stale, *job[2:]))
+                        unlinked[idx] = (rep_idx, duplicates[idx][2])
+                        advance()
+                        continue
+                    candidates.append((signature, idx))
+
+            if targets:
+                yield idx, job
+            else:
+                finish(idx)
+
+    def report(idx, file_results):
+        rel_path = sources[idx]
+        rel_dir = posixpath.dirname(rel_path)
+        for result in file_results:
+            # Name mockups by their path relative to the input/output roots
+            result['filename'] = rel_path
+            if rel_dir:
+                result['output_filename'] = posixpath.join(rel_dir, result['output_filename'])
+                result['variant_filenames'] = [posixpath.join(rel_dir, name) for name in result.get('variant_filenames', [])]
+            tile = result.pop('tile', None)
+            if result['status'] == 'processed':
+                outputs[(idx, result['device_type'])] = result['output_filename']
+                peaks[result['output_filename']] = result.get('peak_rss_mb')
+                if sheet:
+                    sheet_tiles.setdefault(idx, []).append((result['device_type'], tile or sheet_source(result['output_filename'])))
+                if result.get('duplicate_of'):
+                    print(f"🔗 [{label(idx)}] {result['filename']} → {result['output_filename']} (duplicate of {result['duplicate_of']})")
+                else:
+                    print(f"✅ [{label(idx)}] {result['filename']} → {result['output_filename']}")
+            else:
+                print(f"❌ [{label(idx)}] Error processing {result['filename']}: {result['error']}")
+            if progress:
+                progress(result, idx, total)
+            results.append(result)
+            record(result)
+        finish(idx)
+
+    def link_duplicate(idx, rep_idx, job):
+        # Duplicates share their representative's mockups; those it failed
+        # to produce are rendered from the duplicate itself
+        input_path, targets = job[:2]
+        file_results = []
+        fallback = []
+        for device, output_path, output_format in targets:
+            rep_key = outputs.get((rep_idx, device))
+            if rep_key is None:
+                fallback.append((device, output_path, output_format))
+                continue
+            result = _mockup_result(os.path.basename(input_path), device, output_path)
+            result['duplicate_of'] = sources[rep_idx]
+            # Its memory cost is the render it shares
+            result['peak_rss_mb'] = peaks.get(rep_key)
+            try:
+                _link_or_copy(os.path.join(output_folder, rep_key), output_path)
+                for scale in scales:
+                    _link_or_copy(variant_path(os.path.join(output_folder, rep_key), scale), variant_path(output_path, scale))
+                result['variant_filenames'] = [os.path.basename(variant_path(output_path, scale)) for scale in scales]
+            except OSError as e:
+                result.update(status='error', error=str(e))
+            else:
+                # The mockup is the representative's render: record its
+                # fingerprint, so a run without dedupe renders this one
+                entry = pending_entries.get(posixpath.join(posixpath.dirname(sources[idx]), result['output_filename']))
+                rep_entry = pending_entries.get(rep_key) or manifest_entries.get(rep_key)
+                if entry and rep_entry:
+                    entry.update(fingerprint=rep_entry['fingerprint'], duplicate_of=rep_entry['source'])
+            file_results.append(result)
+        if fallback:
+            file_results += render_screenshot_file(input_path, fallback, *job[2:])
+        report(idx, file_results)
+
+    unsaved = 0  # manifest changes not written yet
+    last_saved = time.monotonic()
+
+    def record(result):
+        # Record what was rendered so the next run only rebuilds changed mockups
+        entry = pending_entries.get(result['output_filename'])
+        if result['status'] == 'processed' and entry:
+            manifest_entries[result['output_filename']] = entry
+        else:
+            manifest_entries.pop(result['output_filename'], None)
+        checkpoint()
+
+    def checkpoint():
+        # Note a manifest change; save every so often
+        nonlocal unsaved, last_saved
+        unsaved += 1
+        if unsaved >= MANIFEST_SAVE_EVERY or time.monotonic() - last_saved >= MANIFEST_SAVE_SECONDS:
+            save_manifest(output_folder, manifest)
+            unsaved = 0
+            last_saved = time.monotonic()
+
+    # Process each screenshot
+    jobs = plan_jobs()
+    stage_stats = {}
+    started = time.perf_counter()
+    try:
+        with profile_run(profile_path) if profile_path else contextlib.nullcontext():
+            if pipeline:
+                # The pipelines size their queues and buffers from the full job list
+                jobs = list(jobs)
+                if jobs:
+                    if pipeline == 'staged':
+                        mockups = run_staged_pipeline(jobs, workers, stage_workers, stats=stage_stats)
+                    else:
+                        mockups = run_shared_memory_pipeline(jobs, workers, stage_workers=stage_workers)
+                    for idx, file_results, log in _in_job_order(jobs, mockups):
+                        print(log, end='')
+                        report(idx, file_results)
+            elif workers > 1:
+                from concurrent.futures import ProcessPoolExecutor
+                from concurrent.futures.process import BrokenProcessPool
+                executor = ProcessPoolExecutor(max_workers=workers)
+                # Submit as files are found, 2 per worker ahead; collecting
+                # in submission order keeps console output ordered
+                in_flight = deque()
+
+                def fresh_pool():
+                    nonlocal executor
+                    executor.shutdown(wait=False)
+                    executor = ProcessPoolExecutor(max_workers=workers)
+
+                def resubmit_broken():
+                    for i, (other_idx, other_job, other) in enumerate(in_flight):
+                        if isinstance(other.exception(), BrokenProcessPool):
+                            try:
+                                in_flight[i] = (other_idx, other_job, executor.submit(_render_screenshot_job, other_job))
+                            except BrokenProcessPool:
+                                # The fresh pool died too: collect() re-runs
+                                # the rest one by one
+                                return
+
+                def submit(job):
+                    try:
+                        return executor.submit(_render_screenshot_job, job)
+                    except BrokenProcessPool:
+                        # A worker died while no collect() was waiting on it
+                        fresh_pool()
+                        future = executor.submit(_render_screenshot_job, job)
+                        resubmit_broken()
+                        return future
+
+                def collect():
+                    idx, job, future = in_flight.popleft()
+                    try:
+                        try:
+                            file_results, log = future.result()
+                        except BrokenProcessPool:
+                            # A worker died (e.g. OOM-killed) and took every file
+                            # in flight down with it: re-run this one alone to
+                            # tell whether it is the cause, then the others
+                            fresh_pool()
+                            try:
+                                file_results, log = executor.submit(_render_screenshot_job, job).result()
+                            except BrokenProcessPool:
+                                fresh_pool()
+                                raise
+                            finally:
+                                resubmit_broken()
+                    except Exception as e:
+                        # Fail this file and carry on with the rest, like the
+                        # serial path does
+                        file_results, log = [], ''
+                        for device_type, output_path, _ in job[1]:
+                            result = _mockup_result(os.path.basename(job[0]), device_type, output_path)
+                            result['status'] = 'error'
+                            result['error'] = str(e) or type(e).__name__
+                            file_results.append(result)
+                    print(log, end='')
+                    report(idx, file_results)
+
+                try:
+                    for idx, job in jobs:
+                        in_flight.append((idx, job, submit(job)))
+                        if len(in_flight) >= 2 * workers:
+                            collect()
+                    while in_flight:
+                        collect()
+                finally:
+                    executor.shutdown()
+            else:
+                for idx, job in jobs:
+                    report(idx, render_screenshot_file(*job))
+    finally:
+        # Also on errors and Ctrl+C
+        if unsaved:
+            save_manifest(output_folder, manifest)
+    wall_seconds = time.perf_counter() - started
+
+    if not sources:
+        print(f"❌ No image files found in '{input_folder}'")
+        print(f"   Supported formats: {', '.join(supported_formats)}")
+        return []
+
+    processed_count = sum(1 for r in results if r['status'] == 'processed' and not r.get('duplicate_of'))
+    linked_count = sum(1 for r in results if r['status'] == 'processed' and r.get('duplicate_of'))
+    skipped_count = sum(1 for r in results if r['status'] == 'skipped')
+    trimmed_count = len({r['filename'] for r in results if r.get('trimmed')})
+
     print("-" * 50)
     summary_parts = [f"{processed_count} new mockup(s)"]
     if trimmed_count:
         summary_parts.append(f"{trimmed_count} trimmed")
+    if linked_count:
+        summary_parts.append(f"{linked_count} linked from duplicates")
     if skipped_count:
         summary_parts.append(f"{skipped_count} skipped")
     print(f"🎉 Done! {' | '.join(summary_parts)} saved to '{output_folder}'")
+    if dedupe is not None:
+        groups = build_dedupe_groups(sources, duplicates)
+        print(f"🧬 {len(duplicates)} duplicate(s) in {len(groups)} group(s) were not rendered")
+        for group in groups:
+            others = ', '.join(f"{d['filename']} ({d['distance']} bits)" for d in group['duplicates'])
+            print(f"   {group['representative']} ≈ {others}")
+        if dedupe_report:
+            write_dedupe_report(groups, dedupe_report, dedupe, len(sources))
+            print(f"🧾 Dedupe report saved to '{dedupe_report}'")
+    if sheet and sheet is not contact_sheet:
+        files = sheet.close()
+        if files:
+            print(f"🗂️  Contact sheet: {sheet.tiles} mockup(s) on {len(sheet.pages)} page(s) saved to {', '.join(repr(f) for f in files)}")
+    if stage_stats:
+        print_stage_stats(stage_stats)
+    if report_path:
+        write_run_report(build_run_report(results, wall_seconds, stage_stats), report_path)
+        print(f"📊 Timing report saved to '{report_path}'")
+    if profile_path:
+        print(f"🔬 Profile saved to '{profile_path}'")
+    return results
+
+# Watch mode: files must keep the same size and mtime this long before they
+# are rendered, so half-copied screenshots are not picked up
+WATCH_SETTLE_SECONDS = 0.3
+WATCH_POLL_INTERVAL = 0.5
+
+def warm_caches(device_types=None):
+    """
+    Draw device frames, load fonts and pre-render overlays for the given
+    devices (all by default), so the first real screenshot in this process
+    renders at full speed. Used as a worker-pool initializer.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        blank = Image.new('RGBA', (64, 64), (255, 255, 255, 255))
+        for device_type in device_types or DEVICES:
+            render_device_mockup(blank, device_type)
+
+def _is_screenshot_name(filename):
+    return not filename.startswith('.') and filename.lower().endswith(SUPPORTED_FORMATS)
+
+def _scan_screenshots(folder):
+    """
+    {path: (size, mtime_ns)} of the screenshots in folder.
+    """
+    snapshot = {}
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if _is_screenshot_name(entry.name) and entry.is_file():
+                stat = entry.stat()
+                snapshot[entry.path] = (stat.st_size, stat.st_mtime_ns)
+    return snapshot
+
+def _start_inotify_watcher(folder, changed_paths):
+    """
+    Push created/modified/moved-in paths onto changed_paths using watchdog
+    (inotify on Linux, FSEvents on macOS). Returns the observer, or None
+    when watchdog is not installed.
+    """
+    try:
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+    except ImportError:
+        return None
+
+    class Handler(FileSystemEventHandler):
+        def on_any_event(self, event):
+            # 'closed' is close-after-write; reads only open and close
+            if event.is_directory or event.event_type not in ('created', 'modified', 'moved', 'closed'):
+                return
+            path = getattr(event, 'dest_path', None) or event.src_path
+            if isinstance(path, bytes):
+                path = os.fsdecode(path)
+            if _is_screenshot_name(os.path.basename(path)):
+                changed_paths.put(os.path.join(folder, os.path.basename(path)))
+
+    observer = Observer()
+    observer.schedule(Handler(), folder, recursive=False)
+    observer.daemon = True
+    observer.start()
+    return observer
+
+def watch_folder(input_folder='./screenshots', output_folder='./mockups', device_type='iphone14', auto_trim=True, workers=1, quality='best', output_format=None, overlay_overrides=None, settle_seconds=WATCH_SETTLE_SECONDS, poll_interval=WATCH_POLL_INTERVAL, use_inotify=True, stop_event=None, on_result=None, memory_budget_mb=None, include=None, exclude=None, scales=()):
+    """
+    Render screenshots as they land in input_folder, until Ctrl+C or
+    stop_event is set. Screenshots already in the folder are brought up to
+    date first (unchanged ones are skipped via the manifest).
+
+    Args:
+        input_folder, output_folder, device_type, auto_trim, quality,
+        output_format, overlay_overrides, memory_budget_mb, include,
+        exclude, scales: As for process_all_screenshots(); the folder is
+            watched without subfolders, so globs match filenames
+        workers: Worker processes; each keeps device frames, fonts and
+                 overlays resident between files
+        settle_seconds: How long a file's size and mtime must stay unchanged
+                        before it is rendered (debounces partial writes)
+        poll_interval: Rescan interval when watchdog (inotify) is unavailable
+        use_inotify: False always polls
+        stop_event: Optional threading.Event that ends the watch
+        on_result: Optional callback(result) per rendered mockup; results
+                   carry 'latency_seconds' from the file being noticed to
+                   its mockup being written
+    """
+    device_types = [device_type] if isinstance(device_type, str) else list(device_type)
+    invalid = [d for d in device_types if d not in DEVICES]
+    if invalid or not device_types:
+        print(f"❌ Invalid device type: '{', '.join(invalid)}'")
+        print(f"   Available devices: {', '.join(DEVICES.keys())}")
+        return
+    try:
+        device_formats = {d: resolve_output_format(d, output_format) for d in device_types}
+    except ValueError:
+        print(f"❌ Invalid output format: '{output_format}'")
+        print(f"   Available formats: {', '.join(OUTPUT_FORMATS.keys())}")
+        return
+    try:
+        scales = normalize_scales(scales)
+    except ValueError as e:
+        print(f"❌ Invalid output scale: {e}")
+        print("   Use factors between 0 and 1, or 'thumb'")
+        return
+
+    Path(input_folder).mkdir(parents=True, exist_ok=True)
+    Path(output_folder).mkdir(parents=True, exist_ok=True)
+    manifest = load_manifest(output_folder)
+    stop_event = stop_event or threading.Event()
+
+    changed_paths = queue.Queue()
+    observer = _start_inotify_watcher(input_folder, changed_paths) if use_inotify else None
+    known = _scan_screenshots(input_folder)
+    startup_paths = set(known)
+    for path in known:
+        changed_paths.put(path)
+
+    print(f"👀 Watching '{input_folder}' → '{output_folder}' "
+          f"({'inotify' if observer else f'polling every {poll_interval}s'}, {workers} worker(s))")
+    print(f"🖥️  Device: {', '.join(DEVICES[d]['name'] for d in device_types)}")
+    if scales:
+        print(f"📐 Output sizes: 1x, {', '.join(scale if scale == 'thumb' else f'{scale:g}x' for scale in scales)}")
+    print("   Press Ctrl+C to stop.")
+    print("-" * 50)
+
+    from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+    executor = ProcessPoolExecutor(max_workers=max(1, workers), initializer=warm_caches, initargs=(device_types,))
+    settling = {}     # path -> (size, mtime_ns, last change time, first seen time)
+    in_flight = {}    # future -> (path, pending manifest entries, first seen time)
+    queued_again = set()  # paths that changed while rendering
+    last_scan = time.monotonic()
+
+    def submit(path, seen_at):
+        filename = os.path.basename(path)
+        if (include and not _matches_any(filename, include)) or (exclude and _matches_any(filename, exclude)):
+            return
+        file_overrides = (overlay_overrides or {}).get(filename)
+        targets, skipped, entries = plan_mockups(
+            path, output_folder, device_formats, manifest['entries'],
+            True, auto_trim, quality, file_overrides, '', scales
+        )
+        startup = path in startup_paths
+        startup_paths.discard(path)
+        changed = False
+        for result in skipped:
+            changed |= complete_skipped_variants(result, output_folder, device_formats[result['device_type']], manifest['entries'])
+            if result['status'] == 'error':
+                print(f"❌ Error processing {filename}: {result['error']}")
+                if on_result:
+                    on_result(result)
+            elif startup:
+                # Later events for unchanged files (e.g. a touch) are not worth a line
+                print(f"   Skipping up-to-date mockup: {result['output_filename']}")
+        if changed:
+            save_manifest(output_folder, manifest)
+        if targets:
+            future = executor.submit(_render_screenshot_job, (path, targets, auto_trim, quality, file_overrides, memory_budget_mb, None, scales))
+            in_flight[future] = (path, entries, seen_at)
+
+    try:
+        while not stop_event.is_set():
+            now = time.monotonic()
+
+            # Collect changed paths: watcher events, or a rescan when polling
+            if observer is None and now - last_scan >= poll_interval:
+                last_scan = now
+                try:
+                    snapshot = _scan_screenshots(input_folder)
+                except OSError:
+                    snapshot = known
+                for path, stat in snapshot.items():
+                    if known.get(path) != stat:
+                        changed_paths.put(path)
+                known = snapshot
+            while True:
+                try:
+                    path = changed_paths.get_nowait()
+                except queue.Empty:
+                    break
+                settling.setdefault(path, (None, None, now, now))
+
+            # Debounce: render once size and mtime have stopped changing
+            for path, (size, mtime_ns, changed_at, seen_at) in list(settling.items()):
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    del settling[path]  # deleted or renamed away
+                    continue
+                current = (stat.st_size, stat.st_mtime_ns)
+                if current != (size, mtime_ns):
+                    settling[path] = (*current, now, seen_at)
+                elif now - changed_at >= settle_seconds:
+                    del settling[path]
+                    if any(p == path for p, _, _ in in_flight.values()):
+                        queued_again.add(path)
+                    else:
+                        submit(path, seen_at)
+
+            done = [future for future in in_flight if future.done()]
+            if not done:
+                if in_flight:
+                    wait(list(in_flight), timeout=0.05, return_when=FIRST_COMPLETED)
+                else:
+                    stop_event.wait(0.05)
+                continue
+
+            for future in done:
+                path, entries, seen_at = in_flight.pop(future)
+                try:
+                    file_results, log = future.result()
+                except Exception as e:
+                    # A crashed worker; report it and keep watching
+                    file_results, log = [{'filename': os.path.basename(path), 'device_type': None, 'status': 'error', 'error': str(e), 'output_filename': None}], ''
+                print(log, end='')
+                latency = time.monotonic() - seen_at
+                for result in file_results:
+                    result['latency_seconds'] = latency
+                    output_filename = result['output_filename']
+                    if result['status'] == 'processed':
+                        print(f"✅ {result['filename']} → {output_filename} ({latency:.2f}s)")
+                        if output_filename in entries:
+                            manifest['entries'][output_filename] = entries[output_filename]
+                    else:
+                        print(f"❌ Error processing {result['filename']}: {result['error']}")
+                        manifest['entries'].pop(output_filename, None)
+                    if on_result:
+                        on_result(result)
+                save_manifest(output_folder, manifest)
+                if path in queued_again:
+                    queued_again.discard(path)
+                    changed_paths.put(path)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if observer is not None:
+            observer.stop()
+        executor.shutdown(wait=True, cancel_futures=True)
+        print("-" * 50)
+        print("👋 Stopped watching")
+
+# Exit codes of the command line interface
+EXIT_OK = 0
+EXIT_FAILED = 1       # at least one mockup failed to render
+EXIT_USAGE = 2        # invalid arguments (argparse's own code)
+EXIT_NO_INPUT = 3     # no screenshots matched
+
+def build_arg_parser():
+    """
+    Command line options; every prompt has a flag so runs can be unattended.
+    """
+    parser = argparse.ArgumentParser(description="Place screenshots into device frames")
+    parser.add_argument('input_folder', nargs='?', default='./screenshots',
+                        help="Folder of screenshots (default: ./screenshots)")
+    parser.add_argument('output_folder', nargs='?', default='./mockups',
+                        help="Folder for the mockups (default: ./mockups)")
+    parser.add_argument('-d', '--devices',
+                        help="Comma-separated device ids to render in one pass (skips the device prompt)")
+    parser.add_argument('--list-devices', action='store_true',
+                        help="Print the available device ids and exit")
+    parser.add_argument('--trim', action=argparse.BooleanOptionalAction,
+                        help="Auto-trim white borders (default: yes)")
+    parser.add_argument('--skip-existing', action=argparse.BooleanOptionalAction,
+                        help="Skip mockups that are up to date (default: yes)")
+    parser.add_argument('-y', '--yes', action='store_true',
+                        help="Never prompt; use defaults for anything not given on the command line")
+    parser.add_argument('-r', '--recursive', action='store_true',
+                        help="Include subfolders, mirroring them in the output folder")
+    parser.add_argument('--include', action='append', metavar='GLOB',
+                        help="Only process screenshots whose filename or relative path matches (repeatable)")
+    parser.add_argument('--exclude', action='append', metavar='GLOB',
+                        help="Skip screenshots whose filename or relative path matches (repeatable)")
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help="Only print errors (to stderr)")
+    parser.add_argument('--jsonl', action='store_true',
+                        help="Write one JSON object per mockup to stdout; human output goes to stderr")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Number of worker processes (default: 1)")
+    parser.add_argument('--quality', choices=list(RESIZE_QUALITY), default='best',
+                        help="Resampling mode (default: best)")
+    parser.add_argument('--memory-budget', type=float, metavar='MB',
+                        help="Per-worker decode budget; bigger screenshots are reduced while decoding or fail")
+    parser.add_argument('--dedupe', type=int, nargs='?', const=DEDUPE_THRESHOLD, metavar='BITS',
+                        help=f"Render near-duplicate screenshots once and link the rest (threshold default: {DEDUPE_THRESHOLD})")
+    parser.add_argument('--dedupe-report', metavar='PATH',
+                        help="Write the duplicate groups to a JSON file (implies --dedupe)")
+    parser.add_argument('--scales', metavar='LIST',
+                        help="Also save smaller copies of each mockup, e.g. 1,0.5,thumb (name@0.5x.png, name_thumb.png)")
+    parser.add_argument('--contact-sheet', metavar='PATH',
+                        help="Also tile every mockup onto contact sheet pages (.pdf for one multi-page file, or .png/.jpg)")
+    parser.add_argument('--sheet-page', default='x'.join(map(str, CONTACT_SHEET_PAGE_SIZE)), metavar='WxH',
+                        help="Contact sheet page size in pixels (default: A4 at 300 dpi)")
+    parser.add_argument('--sheet-grid', default='x'.join(map(str, CONTACT_SHEET_GRID)), metavar='COLSxROWS',
+                        help=f"Mockups per contact sheet page (default: {'x'.join(map(str, CONTACT_SHEET_GRID))})")
+    parser.add_argument('--sheet-spacing', type=int, default=CONTACT_SHEET_SPACING, metavar='PX',
+                        help=f"Gap between contact sheet cells (default: {CONTACT_SHEET_SPACING})")
+    parser.add_argument('--sheet-labels', action=argparse.BooleanOptionalAction, default=True,
+                        help="Caption each contact sheet tile with its screenshot and device (default: yes)")
+    parser.add_argument('--sheet-title',
+                        help="Heading printed on every contact sheet page")
+    parser.add_argument('--pipeline', choices=[p for p in PIPELINES if p],
+                        help="Staged execution mode (default: one worker renders each whole file)")
+    parser.add_argument('--format', dest='output_format', choices=list(OUTPUT_FORMATS),
+                        help="Output encoder for every device (default: per device, else png)")
+    parser.add_argument('--stage-workers', metavar='DECODE,COMPOSE,ENCODE',
+                        help="Per-stage worker counts for --pipeline, e.g. 2,4,2")
+    parser.add_argument('--watch', action='store_true',
+                        help="Keep running and render screenshots as they are added or changed")
+    parser.add_argument('--settle', type=float, default=WATCH_SETTLE_SECONDS, metavar='SECONDS',
+                        help=f"--watch: wait until a file is unchanged this long (default: {WATCH_SETTLE_SECONDS})")
+    parser.add_argument('--poll-interval', type=float, default=WATCH_POLL_INTERVAL, metavar='SECONDS',
+                        help=f"--watch: rescan interval without watchdog/inotify (default: {WATCH_POLL_INTERVAL})")
+    parser.add_argument('--report', metavar='PATH',
+                        help="Write per-stage timings to a .json or .csv report")
+    parser.add_argument('--profile', metavar='PATH',
+                        help="Profile rendering with cProfile (or pyinstrument for .html)")
+    return parser
+
+def main(argv=None):
+    """
+    Command line entry point; returns one of the EXIT_* codes.
+    """
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+
+    if args.list_devices:
+        for key, config in DEVICES.items():
+            print(f"{key}\t{config['name']}")
+        return EXIT_OK
+
+    stage_workers = None
+    if args.stage_workers:
+        try:
+            counts = [int(n) for n in args.stage_workers.split(',')]
+        except ValueError:
+            counts = []
+        if len(counts) != 3:
+            parser.error("--stage-workers expects three integers, e.g. 2,4,2")
+        stage_workers = dict(zip(('decode', 'compose', 'encode'), counts))
+
+    scales = None
+    if args.scales:
+        try:
+            scales = normalize_scales(args.scales.split(','))
+        except ValueError as e:
+            parser.error(f"invalid --scales: {e}")
+
+    if args.watch:
+        # Options that only apply to a one-off batch: refuse them rather
+        # than silently ignore them
+        batch_only = {
+            '-r/--recursive': args.recursive,
+            '--no-skip-existing': args.skip_existing is False,
+            '--dedupe': args.dedupe is not None,
+            '--dedupe-report': args.dedupe_report,
+            '--contact-sheet': args.contact_sheet,
+            '--pipeline': args.pipeline,
+            '--stage-workers': args.stage_workers,
+            '--report': args.report,
+            '--profile': args.profile
+        }
+        used = [flag for flag, value in batch_only.items() if value]
+        if used:
+            parser.error(f"{', '.join(used)} cannot be combined with --watch")
+
+    contact_sheet = None
+    if args.contact_sheet:
+        try:
+            page_size, grid = ([int(n) for n in value.lower().split('x')] for value in (args.sheet_page, args.sheet_grid))
+            if len(page_size) != 2 or len(grid) != 2:
+                raise ValueError("expected two numbers like 2480x3508")
+            contact_sheet = ContactSheet(args.contact_sheet, page_size, grid, args.sheet_spacing, labels=args.sheet_labels, title=args.sheet_title)
+        except ValueError as e:
+            parser.error(f"invalid contact sheet layout: {e}")
+
+    selected_devices = None
+    if args.devices:
+        selected_devices = [d.strip() for d in args.devices.split(',') if d.strip()]
+        invalid = [d for d in selected_devices if d not in DEVICES]
+        if invalid or not selected_devices:
+            parser.error(f"unknown device '{', '.join(invalid)}' (choose from: {', '.join(DEVICES)})")
+
+    # Prompts only make sense for a person at a terminal
+    interactive = not (args.yes or args.quiet or args.jsonl) and sys.stdin.isatty()
+
+    # Human-readable output: stdout normally, stderr next to JSON lines, nowhere when quiet
+    json_stream = sys.stdout
+    if args.quiet:
+        log_file = open(os.devnull, 'w', encoding='utf-8')
+    else:
+        log_file = contextlib.nullcontext(sys.stderr if args.jsonl else sys.stdout)
+
+    def progress(result, idx, total):
+        if args.jsonl:
+            record = {key: result.get(key) for key in ('filename', 'device_type', 'output_filename', 'status', 'error', 'trimmed')}
+            record.update(index=idx, total=total)
+            json_stream.write(json.dumps(record) + '\n')
+            json_stream.flush()
+        elif args.quiet and result['status'] == 'error':
+            print(f"❌ {result['filename']} ({result['device_type']}): {result['error']}", file=sys.stderr)
+
+    with log_file as log_stream, contextlib.redirect_stdout(log_stream):
+        print("=" * 50)
+        print("Multi-Device Mockup Generator")
+        print("=" * 50)
+        print()
+
+        DEFAULT_DEVICE = 'iphone14'
+        if selected_devices is None:
+            selected_devices = [prompt_for_device(DEFAULT_DEVICE) if interactive else DEFAULT_DEVICE]
+        auto_trim = args.trim
+        if auto_trim is None:
+            auto_trim = prompt_yes_no("Auto-trim white borders from screenshots?", default=True) if interactive else True
+        skip_existing = args.skip_existing
+        if skip_existing is None:
+            skip_existing = prompt_yes_no("Skip screenshots that already have mockups?", default=True) if interactive else True
+
+        print()
+        print(f"📂 Input folder: {args.input_folder}")
+        print(f"📂 Output folder: {args.output_folder}")
+        print(f"🖥️  Device: {', '.join(DEVICES[d]['name'] for d in selected_devices)}")
+        print(f"✂️  Auto-trim: {'Yes' if auto_trim else 'No'}")
+        print(f"⏭️  Skip existing: {'Yes' if skip_existing else 'No'}")
+        print(f"⚙️  Workers: {args.workers}")
+        print()
+
+        # Create input folder if it doesn't exist
+        Path(args.input_folder).mkdir(parents=True, exist_ok=True)
+
+        if args.watch:
+            watch_folder(
+                args.input_folder,
+                args.output_folder,
+                selected_devices,
+                auto_trim=auto_trim,
+                workers=args.workers,
+                quality=args.quality,
+                output_format=args.output_format,
+                settle_seconds=args.settle,
+                poll_interval=args.poll_interval,
+                on_result=lambda result: progress(result, None, None),
+                memory_budget_mb=args.memory_budget,
+                include=args.include,
+                exclude=args.exclude,
+                scales=scales
+            )
+            return EXIT_OK
+
+        # Process all screenshots
+        results = process_all_screenshots(
+            args.input_folder,
+            args.output_folder,
+            selected_devices,
+            skip_existing=skip_existing,
+            auto_trim=auto_trim,
+            workers=args.workers,
+            quality=args.quality,
+            output_format=args.output_format,
+            pipeline=args.pipeline,
+            stage_workers=stage_workers,
+            report_path=args.report,
+            profile_path=args.profile,
+            include=args.include,
+            exclude=args.exclude,
+            progress=progress,
+            recursive=args.recursive,
+            memory_budget_mb=args.memory_budget,
+            dedupe=DEDUPE_THRESHOLD if args.dedupe is None and args.dedupe_report else args.dedupe,
+            dedupe_report=args.dedupe_report,
+            contact_sheet=contact_sheet,
+            scales=scales
+        )
+        if contact_sheet:
+            files = contact_sheet.close()
+            if files:
+                print(f"🗂️  Contact sheet: {contact_sheet.tiles} mockup(s) on {len(contact_sheet.pages)} page(s) saved to {', '.join(repr(f) for f in files)}")
+
+    if not results:
+        # Nothing ran: no screenshots, or process_all_screenshots() refused
+        # an option (it reports why)
+        screenshots = iter_screenshots(args.input_folder, args.recursive, args.include, args.exclude, skip_folders=[args.output_folder])
+        return EXIT_NO_INPUT if next(screenshots, None) is None else EXIT_USAGE
+    if any(result['status'] == 'error' for result in results):
+        return EXIT_FAILED
+    return EXIT_OK
 
 if __name__ == "__main__":
-    print("=" * 50)
-    print("Multi-Device Mockup Generator")
-    print("=" * 50)
-    print()
-
-    # CONFIGURATION - CHANGE THESE AS NEEDED
-    INPUT_FOLDER = './screenshots'
-    OUTPUT_FOLDER = './mockups'
-
-    DEFAULT_DEVICE = 'iphone14'
-    selected_device = prompt_for_device(DEFAULT_DEVICE)
-    auto_trim = prompt_yes_no("Auto-trim white borders from screenshots?", default=True)
-    skip_existing = prompt_yes_no("Skip screenshots that already have mockups?", default=True)
-
-    print()
-    print(f"📂 Input folder: {INPUT_FOLDER}")
-    print(f"📂 Output folder: {OUTPUT_FOLDER}")
-    print(f"🖥️  Device: {DEVICES[selected_device]['name']}")
-    print(f"✂️  Auto-trim: {'Yes' if auto_trim else 'No'}")
-    print(f"⏭️  Skip existing: {'Yes' if skip_existing else 'No'}")
-    print()
-
-    # Create input folder if it doesn't exist
-    Path(INPUT_FOLDER).mkdir(parents=True, exist_ok=True)
-
-    # Process all screenshots
-    process_all_screenshots(INPUT_FOLDER, OUTPUT_FOLDER, selected_device, skip_existing=skip_existing, auto_trim=auto_trim)
+    sys.exit(main())